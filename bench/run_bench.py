@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+离线基准测试 - 针对本地替身服务器运行完整的续期流程
+
+对每个并发数各跑一轮 (每轮使用全新的会话/状态目录和服务器状态)，输出:
+    - 每台 VPS (从账号开始处理算起) 的耗时 p50 / p95 / 最大值，以及各阶段 p50 / p95
+    - 吞吐量 (账号/分钟)
+    - 进程树 (Python + Playwright 驱动 + Chromium) 的 RSS 峰值
+
+示例:
+    uv run python bench/run_bench.py --accounts 20 --workers 1,2,4,8
+    uv run python bench/run_bench.py --accounts 50 --workers 4 --latency-ms 50 --json bench.json
+
+需要已安装 Playwright Chromium；默认 headless 运行，无需 Xvfb。
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from xserver_stub import StubState, start_server  # noqa: E402
+
+SCRIPT = Path(__file__).resolve().parent.parent / "xserver_renew.py"
+
+
+def load_renew_module(base_url):
+    """配置通过环境变量在导入时读取，因此先设置环境变量再加载脚本"""
+    os.environ.update({
+        'XSERVER_BASE_URL': base_url,
+        'CAPTCHA_API_URL': f"{base_url}/ocr",
+        'YESCAPTCHA_API_URL': f"{base_url}/yescaptcha",
+        'YESCAPTCHA_KEY': 'bench',
+        'TELEGRAM_API_URL': f"{base_url}/telegram",
+        'TELEGRAM_BOT_TOKEN': 'bench',
+        'TELEGRAM_CHAT_ID': '1',
+        'XSERVER_ACCOUNT_INTERVAL': '0',
+        'XSERVER_HEADLESS': os.environ.get('XSERVER_HEADLESS', '1'),
+        'XSERVER_METRICS_FILE': '',
+    })
+    spec = importlib.util.spec_from_file_location("xserver_renew_bench", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def tree_rss(root_pid=None):
+    """读取 /proc，返回 root_pid 及其所有子孙进程的 RSS 之和 (字节)"""
+    root_pid = root_pid or os.getpid()
+    children = {}
+    rss = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            ppid, pages = int(fields[1]), int(fields[21])
+        except (OSError, IndexError, ValueError):
+            continue
+        pid = int(entry)
+        children.setdefault(ppid, []).append(pid)
+        rss[pid] = pages * os.sysconf('SC_PAGE_SIZE')
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total
+
+
+async def sample_peak_rss(stop, interval=0.25):
+    peak = 0
+    while not stop.is_set():
+        peak = max(peak, await asyncio.to_thread(tree_rss))
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+    return peak
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run_round(xr, base_url, stub_state, n_accounts, workers):
+    accounts = [{'email': f"user{i:04d}@bench.local", 'password': 'bench'} for i in range(n_accounts)]
+    with tempfile.TemporaryDirectory(prefix="xserver-bench-") as tmp:
+        tmp = Path(tmp)
+        http = xr.HttpClient(limit_per_host=max(8, workers * 2))
+        state = xr.StateStore(tmp / "state.db")
+        notifier = xr.TelegramNotifier(http, min_interval=0)
+        rt = xr.Runtime(xr.BrowserManager(), http, state,
+                        sessions=xr.SessionStore(tmp / "sessions"),
+                        artifacts=xr.ArtifactWriter(tmp / "debug"), notifier=notifier)
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_peak_rss(stop))
+        start = time.monotonic()
+        try:
+            results = await xr.run_accounts(rt, accounts, workers, force=True)
+            notifier.post(f"bench: {n_accounts} accounts, {workers} workers")
+        finally:
+            await rt.browsers.close()
+            await rt.artifacts.close()
+            elapsed = time.monotonic() - start
+            stop.set()
+            peak = await sampler
+            await notifier.flush()
+            state.close()
+            await http.close()
+
+    totals = [r['timing']['total'] for r in results if r.get('timing')]
+    stages = {}
+    for r in results:
+        for st in (r.get('timing') or {}).get('stages', []):
+            stages.setdefault(st['stage'], []).append(st['seconds'])
+    return {
+        'accounts': n_accounts,
+        'workers': workers,
+        'vps': len(results),
+        'renewed': sum(1 for r in results if r['success']),
+        'failed': sum(1 for r in results if xr.result_outcome(r) == 'failed'),
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput_per_min': round(n_accounts / elapsed * 60, 1) if elapsed else None,
+        'account_p50': percentile(totals, 0.5),
+        'account_p95': percentile(totals, 0.95),
+        'account_max': max(totals) if totals else None,
+        'stages': {k: {'p50': percentile(v, 0.5), 'p95': percentile(v, 0.95)} for k, v in stages.items()},
+        'peak_rss_mb': round(peak / 1024 / 1024, 1),
+        'server': dict(stub_state.counters),
+    }
+
+
+def print_report(rounds):
+    print("=" * 78)
+    print(f"{'workers':>7} {'accounts':>8} {'ok':>4} {'fail':>4} {'elapsed':>8} {'acc/min':>8} "
+          f"{'p50':>6} {'p95':>6} {'max':>6} {'RSS MB':>8}")
+    for r in rounds:
+        fmt = lambda v: f"{v:6.1f}" if v is not None else "     -"
+        print(f"{r['workers']:>7} {r['accounts']:>8} {r['renewed']:>4} {r['failed']:>4} "
+              f"{r['elapsed_seconds']:>8.1f} {r['throughput_per_min']:>8.1f} "
+              f"{fmt(r['account_p50'])} {fmt(r['account_p95'])} {fmt(r['account_max'])} {r['peak_rss_mb']:>8.1f}")
+    print("-" * 78)
+    for r in rounds:
+        stages = ", ".join(f"{k} {v['p50']:.2f}/{v['p95']:.2f}" for k, v in r['stages'].items())
+        print(f"workers={r['workers']} 阶段 p50/p95 (s): {stages}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="xserver-renew 离线基准测试")
+    parser.add_argument('--accounts', type=int, default=10, help="模拟账号数")
+    parser.add_argument('--workers', default="1,4", help="逗号分隔的并发数列表")
+    parser.add_argument('--vps', type=int, default=1, help="每个账号的 VPS 数")
+    parser.add_argument('--due-ratio', type=float, default=1.0, help="处于续期窗口的账号比例")
+    parser.add_argument('--turnstile', choices=['auto', 'click', 'solver'], default='auto')
+    parser.add_argument('--latency-ms', type=int, default=0, help="替身面板每个请求的延迟")
+    parser.add_argument('--ocr-latency-ms', type=int, default=200)
+    parser.add_argument('--solver-latency-ms', type=int, default=2000)
+    parser.add_argument('--json', help="把结果写入 JSON 文件，便于前后对比")
+    args = parser.parse_args()
+
+    rounds = []
+    xr = None
+    port = 0
+    for workers in [int(w) for w in args.workers.split(',') if w.strip()]:
+        # 每轮使用全新的服务器状态，端口沿用第一轮，脚本中的地址保持不变
+        stub_state = StubState(vps_per_account=args.vps, due_ratio=args.due_ratio, turnstile=args.turnstile,
+                               latency_ms=args.latency_ms, ocr_latency_ms=args.ocr_latency_ms,
+                               solver_latency_ms=args.solver_latency_ms)
+        runner, base_url = await start_server(stub_state, port=port)
+        port = int(base_url.rsplit(':', 1)[1])
+        try:
+            if xr is None:
+                xr = load_renew_module(base_url)
+            rounds.append(await run_round(xr, base_url, stub_state, args.accounts, workers))
+        finally:
+            await runner.cleanup()
+
+    print_report(rounds)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'rounds': rounds}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+XServer 面板的本地替身服务器 - 用于离线基准测试
+
+模拟续期流程涉及的所有页面和外部接口:
+    /xapanel/login/xserver/                     登录表单 (#memberid, #user_password, action_user_login)
+    /xapanel/xvps/index                         VPS 列表 (server/detail 链接)
+    /xapanel/xvps/server/detail?id=N            详情页 (有効期限 行，到期前 1 天出现 extend 链接)
+    /xapanel/xvps/server/freevps/extend/...     续期流程 (無料VPS 按钮 → data:image 验证码 + Turnstile + 提交)
+    /ocr                                        OCR 接口替身
+    /yescaptcha/createTask, /getTaskResult      YesCaptcha 接口替身
+    /telegram/bot<token>/sendMessage            Telegram 接口替身
+
+单独运行: python bench/xserver_stub.py --port 8930
+"""
+
+import argparse
+import asyncio
+import itertools
+from datetime import date, timedelta
+
+from aiohttp import web
+
+# 1x1 PNG，作为 data:image 验证码
+CAPTCHA_PNG = ("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==")
+CAPTCHA_ANSWER = "12345"
+SESSION_COOKIE = "XSTUB_SESSION"
+
+PAGE = """<!DOCTYPE html>
+<html lang="ja"><head><meta charset="utf-8"><title>{title}</title>
+<link rel="stylesheet" href="/static/style.css">
+<script async src="https://www.googletagmanager.com/gtag/js?id=G-STUB"></script>
+</head><body><h1>{title}</h1>{body}</body></html>"""
+
+# Turnstile 组件替身:
+#   auto   - 延迟后自动回调 (模拟无感验证)
+#   click  - 点击组件后回调
+#   solver - 只能通过注入 token 完成 (走 YesCaptcha 路径)
+TURNSTILE_WIDGET = """
+<div class="cf-turnstile" data-sitekey="stub" data-callback="callbackTurnstile"
+     style="width:300px;height:65px;border:1px solid #ccc">
+  <input type="hidden" name="cf-turnstile-response" value="">
+</div>
+<script>
+function callbackTurnstile(token) {{
+  document.querySelector('input[name="cf-turnstile-response"]').value = token;
+  document.querySelector('input[type="submit"]').disabled = false;
+}}
+(function () {{
+  const mode = "{mode}";
+  const token = "stub-token-" + "x".repeat(40);
+  if (mode === "auto") setTimeout(() => callbackTurnstile(token), {delay_ms});
+  if (mode === "click") document.querySelector('.cf-turnstile')
+      .addEventListener('click', () => setTimeout(() => callbackTurnstile(token), {delay_ms}));
+}})();
+</script>"""
+
+
+class StubState:
+    """替身服务器的内存状态: 每个账号每台 VPS 的到期日"""
+    def __init__(self, vps_per_account=1, due_ratio=1.0, turnstile='auto', turnstile_delay_ms=300,
+                 latency_ms=0, ocr_latency_ms=0, solver_latency_ms=0):
+        self.vps_per_account = vps_per_account
+        self.due_ratio = due_ratio
+        self.turnstile = turnstile
+        self.turnstile_delay_ms = turnstile_delay_ms
+        self.latency = latency_ms / 1000
+        self.ocr_latency = ocr_latency_ms / 1000
+        self.solver_latency = solver_latency_ms / 1000
+        self.expires = {}
+        self.sessions = {}
+        self.tasks = {}
+        self.counters = {'requests': 0, 'logins': 0, 'renewals': 0, 'ocr': 0, 'solver': 0, 'telegram': 0}
+        self._ids = itertools.count(1)
+
+    def account_expires(self, email):
+        """账号首次出现时分配到期日，按 due_ratio 决定是否已进入续期窗口"""
+        if email not in self.expires:
+            n = len(self.expires)
+            due = (n % 100) < self.due_ratio * 100
+            days = 1 if due else 20
+            self.expires[email] = {i: date.today() + timedelta(days=days) for i in range(1, self.vps_per_account + 1)}
+        return self.expires[email]
+
+
+def _render(title, body):
+    return web.Response(text=PAGE.format(title=title, body=body), content_type='text/html')
+
+
+def _jp(d):
+    return f"{d.year}年{d.month}月{d.day}日"
+
+
+@web.middleware
+async def latency_middleware(request, handler):
+    state = request.app['state']
+    state.counters['requests'] += 1
+    if state.latency:
+        await asyncio.sleep(state.latency)
+    return await handler(request)
+
+
+def _email(request):
+    """返回当前会话对应的账号，未登录时返回 None"""
+    return request.app['state'].sessions.get(request.cookies.get(SESSION_COOKIE, ''))
+
+
+def _require_login(request):
+    email = _email(request)
+    if email is None:
+        raise web.HTTPFound('/xapanel/login/xserver/')
+    return email
+
+
+async def login_page(request):
+    return _render("ログイン", """
+<form method="post" action="/xapanel/login/xserver/">
+  <input type="text" id="memberid" name="memberid">
+  <input type="password" id="user_password" name="user_password">
+  <input type="submit" name="action_user_login" value="ログインする">
+</form>""")
+
+
+async def login_submit(request):
+    state = request.app['state']
+    form = await request.post()
+    email = form.get('memberid', '')
+    if not email or form.get('user_password') == 'wrong':
+        return await login_page(request)
+    state.counters['logins'] += 1
+    token = f"s{next(state._ids)}"
+    state.sessions[token] = email
+    state.account_expires(email)
+    response = web.HTTPFound('/xapanel/xvps/index')
+    response.set_cookie(SESSION_COOKIE, token, path='/')
+    raise response
+
+
+async def vps_index(request):
+    email = _require_login(request)
+    rows = "".join(
+        f'<tr><td>VPS {i}</td><td><a href="/xapanel/xvps/server/detail?id={i}">詳細</a></td></tr>'
+        for i in request.app['state'].account_expires(email))
+    return _render("VPS一覧", f"<table>{rows}</table>")
+
+
+async def vps_detail(request):
+    email = _require_login(request)
+    vps = int(request.query.get('id', 1))
+    expire = request.app['state'].account_expires(email).get(vps)
+    if expire is None:
+        raise web.HTTPNotFound()
+    extend = ""
+    if (expire - date.today()).days <= 1:
+        extend = f'<a href="/xapanel/xvps/server/freevps/extend/index?id_vps={vps}">期限を延長する</a>'
+    return _render("VPS詳細", f"""
+<img src="/static/logo.png" alt="logo">
+<table><tr><th>有効期限</th><td>{_jp(expire)}</td></tr></table>{extend}""")
+
+
+async def extend_index(request):
+    _require_login(request)
+    vps = int(request.query.get('id_vps', 1))
+    return _render("無料VPSの延長", f"""
+<a href="/xapanel/xvps/server/freevps/extend/conf?id_vps={vps}">無料VPSの利用を継続する</a>""")
+
+
+async def extend_conf(request):
+    _require_login(request)
+    state = request.app['state']
+    vps = int(request.query.get('id_vps', 1))
+    widget = TURNSTILE_WIDGET.format(mode=state.turnstile, delay_ms=state.turnstile_delay_ms)
+    return _render("無料VPSの延長確認", f"""
+<form method="post" action="/xapanel/xvps/server/freevps/extend/do">
+  <input type="hidden" name="id_vps" value="{vps}">
+  <img src="data:image/png;base64,{CAPTCHA_PNG}" style="border:1px solid #000">
+  <input type="text" name="auth_code" placeholder="画像の数字を入力してください">
+  {widget}
+  <input type="submit" value="無料VPSの利用を継続する" disabled>
+</form>""")
+
+
+async def extend_do(request):
+    email = _require_login(request)
+    state = request.app['state']
+    form = await request.post()
+    vps = int(form.get('id_vps', 1))
+    expires = state.account_expires(email)
+    if form.get('auth_code') != CAPTCHA_ANSWER or len(form.get('cf-turnstile-response', '')) <= 10:
+        return _render("エラー", "<p>認証に失敗しました</p>")
+    if vps in expires and (expires[vps] - date.today()).days <= 1:
+        expires[vps] += timedelta(days=2)
+        state.counters['renewals'] += 1
+    return _render("完了", "<p>利用期限を更新しました</p>")
+
+
+async def static_asset(request):
+    return web.Response(body=b"\0" * 2048, content_type='application/octet-stream')
+
+
+async def ocr(request):
+    state = request.app['state']
+    state.counters['ocr'] += 1
+    await request.text()
+    if state.ocr_latency:
+        await asyncio.sleep(state.ocr_latency)
+    return web.Response(text=CAPTCHA_ANSWER)
+
+
+async def yescaptcha_create(request):
+    state = request.app['state']
+    state.counters['solver'] += 1
+    task_id = f"t{next(state._ids)}"
+    state.tasks[task_id] = asyncio.get_running_loop().time() + state.solver_latency
+    return web.json_response({'errorId': 0, 'taskId': task_id})
+
+
+async def yescaptcha_result(request):
+    state = request.app['state']
+    data = await request.json()
+    ready_at = state.tasks.get(data.get('taskId'))
+    if ready_at is None:
+        return web.json_response({'errorId': 1, 'errorDescription': 'unknown task'})
+    if asyncio.get_running_loop().time() < ready_at:
+        return web.json_response({'errorId': 0, 'status': 'processing'})
+    return web.json_response({'errorId': 0, 'status': 'ready', 'solution': {'token': 'stub-token-' + 'y' * 40}})
+
+
+async def telegram_send(request):
+    request.app['state'].counters['telegram'] += 1
+    await request.post()
+    return web.json_response({'ok': True, 'result': {}})
+
+
+def make_app(state=None):
+    app = web.Application(middlewares=[latency_middleware])
+    app['state'] = state or StubState()
+    app.router.add_get('/xapanel/login/xserver/', login_page)
+    app.router.add_post('/xapanel/login/xserver/', login_submit)
+    app.router.add_get('/xapanel/xvps/index', vps_index)
+    app.router.add_get('/xapanel/xvps/server/detail', vps_detail)
+    app.router.add_get('/xapanel/xvps/server/freevps/extend/index', extend_index)
+    app.router.add_get('/xapanel/xvps/server/freevps/extend/conf', extend_conf)
+    app.router.add_post('/xapanel/xvps/server/freevps/extend/do', extend_do)
+    app.router.add_get('/static/{name}', static_asset)
+    app.router.add_post('/ocr', ocr)
+    app.router.add_post('/yescaptcha/createTask', yescaptcha_create)
+    app.router.add_post('/yescaptcha/getTaskResult', yescaptcha_result)
+    app.router.add_post('/telegram/bot{token}/sendMessage', telegram_send)
+    return app
+
+
+async def start_server(state=None, host='127.0.0.1', port=0):
+    """在当前事件循环中启动替身服务器，返回 (runner, base_url)"""
+    app = make_app(state)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XServer 面板替身服务器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8930)
+    parser.add_argument('--vps', type=int, default=1, help="每个账号的 VPS 数")
+    parser.add_argument('--due-ratio', type=float, default=1.0, help="处于续期窗口的账号比例")
+    parser.add_argument('--turnstile', choices=['auto', 'click', 'solver'], default='auto')
+    parser.add_argument('--latency-ms', type=int, default=0, help="每个请求附加的延迟")
+    args = parser.parse_args()
+    state = StubState(vps_per_account=args.vps, due_ratio=args.due_ratio,
+                      turnstile=args.turnstile, latency_ms=args.latency_ms)
+    print(f"替身服务器: http://{args.host}:{args.port}")
+    web.run_app(make_app(state), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""账号文件 (TOML / CSV / JSONL) 的解析和分片"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import xserver_renew  # noqa: E402
+
+
+def _emails(accounts):
+    return [acc['email'] for acc in accounts]
+
+
+def test_parse_shard():
+    assert xserver_renew.parse_shard('') is None
+    assert xserver_renew.parse_shard('0/3') == (0, 3)
+    assert xserver_renew.parse_shard('2/3') == (2, 3)
+    for bad in ('3/3', '-1/3', '0/0', '1', 'a/b', '1/2/3'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            xserver_renew.parse_shard(bad)
+
+
+def test_shards_partition_accounts(tmp_path):
+    path = tmp_path / "accounts.csv"
+    path.write_text("email,password\n" + "".join(f"u{i}@example.com,p{i}\n" for i in range(30)))
+    everyone = _emails(xserver_renew.iter_accounts(path))
+    shards = [_emails(xserver_renew.iter_accounts(path, (i, 3))) for i in range(3)]
+    assert sorted(sum(shards, [])) == sorted(everyone)
+    assert all(shards)
+    # 分片只取决于邮箱 (不区分大小写)，与文件中的顺序无关
+    assert xserver_renew.shard_of('U1@Example.com', 3) == xserver_renew.shard_of('u1@example.com', 3)
+
+
+@pytest.mark.skipif(xserver_renew.tomllib is None, reason="TOML 需要 Python 3.11+")
+def test_toml_defaults_password_env_and_enabled(tmp_path, monkeypatch):
+    monkeypatch.setenv('XSERVER_TEST_PW', 'secret')
+    path = tmp_path / "accounts.toml"
+    path.write_text('''
+[defaults]
+tabs = 3
+
+[[accounts]]
+email = "a@example.com"
+password_env = "XSERVER_TEST_PW"
+
+[[accounts]]
+email = "b@example.com"
+password = "pb"
+tabs = 1
+proxy = "http://127.0.0.1:3128"
+
+[[accounts]]
+email = "c@example.com"
+password = "pc"
+enabled = false
+
+[[accounts]]
+email = "d@example.com"
+password_env = "XSERVER_TEST_PW_MISSING"
+''')
+    accounts = list(xserver_renew.iter_accounts(path))
+    assert accounts == [
+        {'email': 'a@example.com', 'password': 'secret', 'tabs': 3},
+        {'email': 'b@example.com', 'password': 'pb', 'tabs': 1, 'proxy': 'http://127.0.0.1:3128'},
+    ]
+
+
+def test_csv_enabled_strings_and_empty_cells(tmp_path):
+    path = tmp_path / "accounts.csv"
+    path.write_text(
+        "email,password,tabs,enabled,stage_retries\n"
+        "# 注释行\n"
+        "a@example.com,pa,,,\n"
+        "b@example.com,pb,3,false,\n"
+        "c@example.com,pc,2,yes,ocr=4\n"
+        "A@example.com,dup,,,\n"
+        ",nopassword,,,\n")
+    accounts = list(xserver_renew.iter_accounts(path))
+    assert accounts == [
+        {'email': 'a@example.com', 'password': 'pa'},
+        {'email': 'c@example.com', 'password': 'pc', 'tabs': 2, 'enabled': True, 'stage_retries': 'ocr=4'},
+    ]
+
+
+def test_jsonl_skips_invalid_lines(tmp_path, monkeypatch):
+    monkeypatch.setenv('XSERVER_TEST_PW', 'secret')
+    path = tmp_path / "accounts.jsonl"
+    path.write_text(
+        '{"email": "a@example.com", "password": "pa"}\n'
+        '\n'
+        '# 注释\n'
+        'not json\n'
+        '["a", "list"]\n'
+        '{"email": "b@example.com", "password_env": "XSERVER_TEST_PW", "stage_retries": "ocr=3"}\n'
+        '{"email": "c@example.com", "password": "pc", "enabled": false}\n')
+    accounts = list(xserver_renew.iter_accounts(path))
+    assert accounts == [
+        {'email': 'a@example.com', 'password': 'pa'},
+        {'email': 'b@example.com', 'password': 'secret', 'stage_retries': 'ocr=3'},
+    ]
+
+
+def test_unsupported_suffix(tmp_path):
+    path = tmp_path / "accounts.yaml"
+    path.write_text("")
+    with pytest.raises(RuntimeError):
+        list(xserver_renew.iter_accounts(path))
@@ -0,0 +1,46 @@
+"""HttpClient 借用调用方 aiohttp 会话时，各账号的 cookie 互不影响"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import xserver_renew  # noqa: E402
+
+
+async def _echo_cookie(request):
+    # 模拟 XServer 在响应中下发账号自己没有保存的会话 cookie
+    response = web.Response(text=request.headers.get('Cookie', ''))
+    response.set_cookie('XSERVER_SESS', f"{request.query['account']}-rotated", path='/')
+    return response
+
+
+def test_accounts_on_caller_session_do_not_share_cookies():
+    async def run():
+        app = web.Application()
+        app.router.add_get('/', _echo_cookie)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/"
+        try:
+            # unsafe=True 让 jar 也接受 IP 地址下发的 cookie，与真实域名行为一致
+            async with aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True)) as shared:
+                sent = []
+                for account in ('A', 'B', 'A'):
+                    client = xserver_renew.HttpClient(session=shared)
+                    _, body, _ = await client.get_page(f"{url}?account={account}",
+                                                       headers={'Cookie': f"SID={account}"})
+                    sent.append(body)
+                    await client.close()
+                assert not shared.closed
+                assert len(shared.cookie_jar) == 0
+            return sent
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(run()) == ['SID=A', 'SID=B', 'SID=A']
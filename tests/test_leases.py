@@ -0,0 +1,85 @@
+"""LeaseStore: 同一账号同一时间只有一个持有者，过期后可被接管"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import xserver_renew  # noqa: E402
+
+LeaseStore = xserver_renew.LeaseStore
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_acquire_is_exclusive_until_release(tmp_path):
+    async def run():
+        a = LeaseStore(tmp_path / "state.db", ttl=60, owner='A')
+        b = LeaseStore(tmp_path / "state.db", ttl=60, owner='B')
+        try:
+            steps = [await a.acquire('x@example.com'),
+                     await b.acquire('x@example.com'),
+                     await b.holder('x@example.com'),
+                     await a.acquire('x@example.com')]  # 同一持有者可以重复取得
+            await a.release('x@example.com')
+            steps += [await a.holder('x@example.com'), await b.acquire('x@example.com'),
+                      await b.holder('x@example.com')]
+            return steps
+        finally:
+            await a.close()
+            await b.close()
+
+    assert _run(run()) == [True, False, 'A', True, None, True, 'B']
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    async def run():
+        a = LeaseStore(tmp_path / "state.db", ttl=0.2, owner='A')
+        b = LeaseStore(tmp_path / "state.db", ttl=60, owner='B')
+        try:
+            assert await a.acquire('x@example.com')
+            assert not await b.acquire('x@example.com')
+            await asyncio.sleep(0.3)  # A 的租约过期 (续约间隔至少 1 秒，期间不会续上)
+            taken = await b.acquire('x@example.com')
+            lost = await a.renew()
+            return taken, lost, a.held, await b.holder('x@example.com')
+        finally:
+            await a.close()
+            await b.close()
+
+    assert _run(run()) == (True, ['x@example.com'], set(), 'B')
+
+
+def test_renew_extends_held_leases(tmp_path):
+    async def run():
+        a = LeaseStore(tmp_path / "state.db", ttl=0.5, owner='A')
+        b = LeaseStore(tmp_path / "state.db", ttl=60, owner='B')
+        try:
+            assert await a.acquire('x@example.com')
+            for _ in range(3):
+                await asyncio.sleep(0.25)
+                assert await a.renew() == []
+            return await b.acquire('x@example.com')
+        finally:
+            await a.close()
+            await b.close()
+
+    assert _run(run()) is False
+
+
+def test_close_releases_held_leases(tmp_path):
+    async def run():
+        a = LeaseStore(tmp_path / "state.db", ttl=60, owner='A')
+        await a.acquire('x@example.com')
+        await a.acquire('y@example.com')
+        entries = [e['email'] for e in a.entries()]
+        await a.close()
+        b = LeaseStore(tmp_path / "state.db", ttl=60, owner='B')
+        try:
+            return entries, b.entries(), await b.acquire('x@example.com')
+        finally:
+            await b.close()
+
+    assert _run(run()) == (['x@example.com', 'y@example.com'], [], True)
@@ -0,0 +1,193 @@
+"""单台 VPS 的阶段重试预算和检查点恢复 (不需要浏览器，页面由替身模拟)"""
+
+import asyncio
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import xserver_renew  # noqa: E402
+
+SETTINGS = xserver_renew.Settings(base_url="https://panel.test", retry_backoff=0)
+DETAIL = '/detail?id=1'
+EXTEND = '/ext?id_vps=1'
+
+
+class Panel:
+    """模拟一台明天到期的 VPS: 验证码答案正确时提交后到期日延长 2 天"""
+    def __init__(self, ocr=(), submit_timeouts=0):
+        self.expire = date.today() + timedelta(days=1)
+        self.ocr = list(ocr)
+        self.submit_timeouts = submit_timeouts
+        self.filled = None
+        self.submits = 0
+        self.gotos = []
+
+
+class Context:
+    async def new_cdp_session(self, page):
+        return None
+
+
+class Page:
+    def __init__(self, panel):
+        self.panel = panel
+        self.url = 'about:blank'
+        self.context = Context()
+
+    async def click(self, selector, **kwargs):
+        if 'submit' in selector:
+            self.panel.submits += 1
+            if self.panel.filled == '12345':
+                self.panel.expire += timedelta(days=2)
+            self.url = SETTINGS.base_url + '/done'
+
+    async def evaluate(self, js):
+        return '完了' if self.url.endswith('/done') else ''
+
+
+class Ready:
+    def __init__(self, page):
+        self.page = page
+        self.timings = []
+
+    async def goto(self, url):
+        self.page.panel.gotos.append(url.replace(SETTINGS.base_url, ''))
+        self.page.url = url
+
+    async def load_state(self, *args):
+        return True
+
+    async def network_idle(self):
+        return True
+
+    async def selector(self, *args, **kwargs):
+        return True
+
+    async def response(self, *args, **kwargs):
+        panel = self.page.panel
+        if panel.submit_timeouts:
+            panel.submit_timeouts -= 1
+            raise asyncio.TimeoutError("提交响应超时")
+        return True
+
+
+async def _snapshot(page):
+    panel = page.panel
+    if 'detail' in page.url:
+        due = (panel.expire - date.today()).days <= 1
+        return {'expireText': f"{panel.expire.year}年{panel.expire.month}月{panel.expire.day}日",
+                'extendHref': EXTEND if due else None}
+    if 'ext' in page.url:
+        return {'hasFreeVpsButton': False, 'captcha': 'data:image/png;base64,xx', 'inputs': ['x'],
+                'turnstile': {}, 'submit': {'selector': 'input[type="submit"]', 'text': 'go'}}
+    return {}
+
+
+class Runtime:
+    http = None
+    settings = SETTINGS
+
+
+@pytest.fixture
+def panel_page(monkeypatch):
+    """把页面相关的函数换成替身，返回 renew_vps 的调用函数"""
+    async def ocr(http, image):
+        answer = panel.ocr.pop(0) if panel.ocr else '12345'
+        return answer or None
+
+    async def fill(page, answer, selectors):
+        page.panel.filled = answer
+        return True
+
+    async def turnstile(page, cdp, ready, http, snapshot):
+        return True
+
+    async def debug_info(rt, page, email, stage):
+        pass
+
+    monkeypatch.setattr(xserver_renew, 'Readiness', Ready)
+    monkeypatch.setattr(xserver_renew, 'take_snapshot', _snapshot)
+    monkeypatch.setattr(xserver_renew, 'ocr_captcha', ocr)
+    monkeypatch.setattr(xserver_renew, 'fill_captcha', fill)
+    monkeypatch.setattr(xserver_renew, 'handle_turnstile', turnstile)
+    monkeypatch.setattr(xserver_renew, 'save_debug_info', debug_info)
+    panel = None
+
+    def run(p, budget=None):
+        nonlocal panel
+        panel = p
+
+        async def main():
+            timer = xserver_renew.StageTimer('a@example.com')
+            xserver_renew._stage_timer.set(timer)
+            return await xserver_renew.renew_vps(Runtime(), Page(p), 'a@example.com', DETAIL, timer,
+                                                 budget=budget or xserver_renew.RetryBudget(backoff=0))
+        return asyncio.run(main())
+    return run
+
+
+def _stages(result):
+    return [(s['stage'], s['outcome']) for s in result['timing']['stages']]
+
+
+def test_parse_stage_retries_overrides_defaults():
+    budgets = xserver_renew.parse_stage_retries("ocr=5, turnstile=0,bogus,submit=x")
+    assert budgets['ocr'] == 5
+    assert budgets['turnstile'] == 0
+    assert budgets['submit'] == xserver_renew.DEFAULT_STAGE_RETRIES['submit']
+    assert 'bogus' not in budgets
+
+
+def test_retry_budget_is_per_stage_and_backs_off(monkeypatch):
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+    monkeypatch.setattr(xserver_renew.asyncio, 'sleep', sleep)
+
+    async def run():
+        budget = xserver_renew.RetryBudget({'ocr': 3, 'submit': 1}, backoff=2)
+        ocr = [await budget.consume('ocr') for _ in range(4)]
+        submit = [await budget.consume('submit') for _ in range(2)]
+        return ocr, submit, await budget.consume('login')
+
+    assert asyncio.run(run()) == ([True, True, True, False], [True, False], False)
+    assert sleeps == [2, 4, 8, 2]
+
+
+def test_retry_budget_reads_current_settings():
+    async def run():
+        xserver_renew._settings.set(xserver_renew.Settings(stage_retries='ocr=7', retry_backoff=0.5))
+        return xserver_renew.RetryBudget()
+
+    budget = asyncio.run(run())
+    assert budget.budgets['ocr'] == 7
+    assert budget.backoff == 0.5
+
+
+def test_ocr_failure_reopens_extend_page_without_detail(panel_page):
+    panel = Panel(ocr=[''])
+    result = panel_page(panel)
+    assert result['success']
+    assert panel.gotos == [DETAIL, EXTEND, EXTEND, DETAIL]
+    assert _stages(result)[:3] == [('detail', 'ok'), ('extend', 'ok'), ('ocr', 'error')]
+
+
+def test_submit_timeout_resumes_at_verify_without_resubmitting(panel_page):
+    panel = Panel(submit_timeouts=1)
+    result = panel_page(panel)
+    assert result['success']
+    assert panel.submits == 1
+    assert panel.gotos == [DETAIL, EXTEND, DETAIL]
+    assert ('verify', 'ok') in _stages(result)
+
+
+def test_exhausted_budget_fails_without_retrying(panel_page):
+    panel = Panel(ocr=['', ''])
+    result = panel_page(panel, budget=xserver_renew.RetryBudget({}, backoff=0))
+    assert not result['success']
+    assert panel.submits == 0
+    assert panel.gotos == [DETAIL, EXTEND]
@@ -0,0 +1,95 @@
+"""StateStore 的下次检查时间和跳过判断"""
+
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import xserver_renew  # noqa: E402
+
+NOW = datetime(2026, 5, 10, 10, 0)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = xserver_renew.StateStore(tmp_path / "state.db", margin_days=1, recheck_hours=72, jitter_minutes=0,
+                                     retry_minutes=15, retry_max_hours=4)
+    yield store
+    store.close()
+
+
+def test_failures_back_off_up_to_max(store):
+    expire = date(2026, 5, 11)
+    assert store.next_check_time(expire, 1, NOW) == NOW + timedelta(minutes=15)
+    assert store.next_check_time(expire, 2, NOW) == NOW + timedelta(minutes=30)
+    assert store.next_check_time(expire, 4, NOW) == NOW + timedelta(hours=2)
+    assert store.next_check_time(expire, 10, NOW) == NOW + timedelta(hours=4)
+
+
+def test_next_check_follows_renew_window(store):
+    # 未知到期时间: 隔 retry 再看
+    assert store.next_check_time(None, 0, NOW) == NOW + timedelta(minutes=15)
+    # 后天到期: 明天零点续期窗口打开
+    assert store.next_check_time(date(2026, 5, 12), 0, NOW) == datetime(2026, 5, 11)
+    # 明天到期: 窗口已打开但还没续期，隔 retry 再看
+    assert store.next_check_time(date(2026, 5, 11), 0, NOW) == NOW + timedelta(minutes=15)
+    # 很久以后到期: 最迟 recheck_hours 后复查
+    assert store.next_check_time(date(2026, 6, 30), 0, NOW) == NOW + timedelta(hours=72)
+    # 已经过期: 不频繁重试
+    assert store.next_check_time(date(2026, 5, 1), 0, NOW) == NOW + timedelta(hours=72)
+
+
+def test_next_check_jitter(tmp_path):
+    store = xserver_renew.StateStore(tmp_path / "state.db", jitter_minutes=60, retry_minutes=15)
+    try:
+        base = datetime(2026, 5, 11)
+        times = [store.next_check_time(date(2026, 5, 12), 0, NOW) for _ in range(20)]
+        assert all(base <= t < base + timedelta(minutes=60) for t in times)
+        assert len(set(times)) > 1
+        # 失败重试不加随机偏移
+        assert store.next_check_time(date(2026, 5, 12), 1, NOW) == NOW + timedelta(minutes=15)
+    finally:
+        store.close()
+
+
+def test_schedule_counts_consecutive_failures(store):
+    assert store.schedule('a@example.com', True, NOW) == NOW + timedelta(minutes=15)
+    assert store.schedule('a@example.com', True, NOW) == NOW + timedelta(minutes=30)
+    assert store.get('a@example.com')['failures'] == 2
+    store.schedule('a@example.com', False, NOW)
+    assert store.get('a@example.com')['failures'] == 0
+
+
+def _checked(store, email, expire):
+    store.record({'email': email, 'success': False, 'msg': '未找到续期链接', 'old_expire': expire})
+
+
+def test_skip_reason(store):
+    now = datetime.now()
+    today = now.date()
+    assert store.skip_reason('new@example.com', now) is None
+
+    _checked(store, 'far@example.com', today + timedelta(days=10))
+    reason = store.skip_reason('far@example.com', now)
+    assert reason and '剩余 10 天' in reason
+
+    # 续期窗口 (1 天) + margin_days (1 天) 以内的账号需要处理
+    _checked(store, 'soon@example.com', today + timedelta(days=2))
+    assert store.skip_reason('soon@example.com', now) is None
+    _checked(store, 'later@example.com', today + timedelta(days=3))
+    assert store.skip_reason('later@example.com', now) is not None
+
+    # 距上次检查超过 recheck_hours 时强制检查
+    assert store.skip_reason('far@example.com', now + timedelta(hours=73)) is None
+
+    # 没有解析到到期时间的记录不跳过
+    _checked(store, 'unknown@example.com', None)
+    assert store.skip_reason('unknown@example.com', now) is None
+
+
+def test_record_keeps_known_expire(store):
+    _checked(store, 'a@example.com', date(2026, 6, 1))
+    _checked(store, 'a@example.com', None)
+    assert store.get('a@example.com')['expire'] == date(2026, 6, 1)
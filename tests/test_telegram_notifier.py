@@ -0,0 +1,99 @@
+"""TelegramNotifier 的消息切分和限流重试 (本地替身代替 Telegram API)"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import xserver_renew  # noqa: E402
+
+TelegramNotifier = xserver_renew.TelegramNotifier
+
+
+def test_chunks_split_on_line_boundaries():
+    text = "\n".join(f"line {i:02d}" for i in range(10))  # 每行 7 个字符
+    chunks = TelegramNotifier.chunks(text, limit=20)
+    assert chunks == ["line 00\nline 01", "line 02\nline 03", "line 04\nline 05",
+                      "line 06\nline 07", "line 08\nline 09"]
+    assert "\n".join(chunks) == text
+
+
+def test_chunks_hard_split_overlong_line():
+    chunks = TelegramNotifier.chunks("short\n" + "x" * 25 + "\ntail", limit=10)
+    assert chunks == ["short", "x" * 10, "x" * 10, "x" * 5 + "\ntail"]
+    assert all(len(c) <= 10 for c in chunks)
+
+
+def test_chunks_default_limit():
+    text = "\n".join("y" * 100 for _ in range(100))
+    chunks = TelegramNotifier.chunks(text)
+    assert len(chunks) == 3
+    assert all(len(c) <= TelegramNotifier.LIMIT for c in chunks)
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_post('/bottoken/sendMessage', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+
+def _notify(responses, texts, **kwargs):
+    """依次用 responses 中的 (状态码, JSON) 应答，返回收到的请求和通知器"""
+    received = []
+
+    async def handler(request):
+        data = await request.post()
+        received.append((time.monotonic(), dict(data)))
+        status, body = responses.pop(0) if responses else (200, {'ok': True})
+        return web.json_response(body, status=status)
+
+    async def run():
+        runner, url = await _serve(handler)
+        http = xserver_renew.HttpClient()
+        notifier = TelegramNotifier(http, token='token', chat_id='42', api_url=url, min_interval=0, **kwargs)
+        try:
+            for text in texts:
+                notifier.post(text)
+            await notifier.flush(timeout=20)
+        finally:
+            await http.close()
+            await runner.cleanup()
+        return notifier
+
+    return received, asyncio.run(run())
+
+
+def test_429_waits_for_retry_after():
+    received, notifier = _notify(
+        [(429, {'ok': False, 'description': 'Too Many Requests', 'parameters': {'retry_after': 1}})],
+        ["hello"])
+    assert notifier.sent == 1
+    assert notifier.failed == 0
+    assert [data['text'] for _, data in received] == ["hello", "hello"]
+    assert received[1][0] - received[0][0] >= 0.9
+
+
+def test_html_parse_error_falls_back_to_plain_text():
+    received, notifier = _notify([(400, {'ok': False, 'description': "can't parse entities"})], ["<b>x"])
+    assert notifier.sent == 1
+    assert received[0][1].get('parse_mode') == 'HTML'
+    assert 'parse_mode' not in received[1][1]
+
+
+def test_client_error_is_not_retried():
+    received, notifier = _notify([(403, {'ok': False, 'description': 'Forbidden'})] * 3, ["hello"])
+    assert len(received) == 1  # 除 HTML 解析失败的 400 外，4xx 不重试
+    assert notifier.failed == 1
+
+
+def test_queued_messages_are_merged():
+    received, notifier = _notify([], ["a", "b", "c"])
+    assert notifier.sent == 1
+    assert received[0][1]['text'] == "a\n\nb\n\nc"
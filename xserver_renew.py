@@ -0,0 +1,3576 @@
+#!/usr/bin/env python3
+"""
+XServer VPS 免费VPS自动续期 - 命令行 (xserver-renew / python xserver-renew.py) 和异步库
+
+库接口 (在已有的事件循环中调用，可复用调用方的浏览器和 HTTP 会话):
+    import xserver_renew
+    results = await xserver_renew.renew("email:password", browser=browser, http=session)
+    info = await xserver_renew.check("email:password")
+    settings = xserver_renew.Settings.from_env()  # 或直接构造 Settings(data_dir=..., yescaptcha_key=...)
+    results = await xserver_renew.renew("email:password", settings=settings)
+库调用未传入 settings 时在调用时读取下列环境变量，命令行在启动时读取。
+Playwright 只在需要浏览器时才导入，--help / --check-only 不加载它。
+
+环境变量:
+    XSERVER_ACCOUNT: 账号密码，格式 email:password，多个用 & 分隔
+    XSERVER_ACCOUNTS_FILE: 账号文件 (.toml / .csv / .jsonl)，设置后代替 XSERVER_ACCOUNT，也可用 --accounts 指定
+    XSERVER_SHARD: 只处理第 i 个分片的账号，格式 i/n (可选，也可用 --shard 指定)
+    XSERVER_LEASE_TTL: 账号租约的有效秒数，进程崩溃后租约在此时间后过期 (可选，默认 600)
+    XSERVER_MEM_LIMIT_MB: 本进程树 (含 Chromium) 内存超过该值时暂停开始新账号并回收浏览器 (可选，默认 0 不限制)
+    XSERVER_MIN_FREE_MB: 系统可用内存低于该值时暂停开始新账号 (可选，默认 300，0 为不检查)
+    XSERVER_RUN_BUDGET: 整个运行的时间预算 (秒)，用完后剩余账号推迟到下次运行 (可选，默认 0 不限制)
+    XSERVER_ACCOUNT_MIN_SECONDS: 一个需要浏览器的账号的最低预计耗时，剩余预算少于该秒数 (或已完成账号的平均耗时) 时不再开始新账号 (可选，默认 60)
+    XSERVER_NAV_CACHE: 设为 0 时不缓存详情页地址，每次都从 VPS 列表页进入 (可选，默认 1)
+    XSERVER_NAV_CACHE_HOURS: 详情页地址缓存的有效小时数，过期后重新读取列表页以发现新增的 VPS (可选，默认 168)
+    CAPTCHA_API_URL: OCR API 地址 (日文验证码识别)
+    YESCAPTCHA_KEY: YesCaptcha API Key (解决 Turnstile，必需)
+    TELEGRAM_BOT_TOKEN: Telegram机器人Token (可选)
+    TELEGRAM_CHAT_ID: Telegram聊天ID (可选)
+    XSERVER_WORKERS: 并发处理的账号数 (可选，默认 1，也可用 --workers 指定)
+    XSERVER_PROCESSES: 把账号分给多少个工作进程，每个进程有自己的 Chromium，进程内再按 XSERVER_WORKERS 并发 (可选，默认 1，也可用 --processes 指定)
+    XSERVER_BROWSER_RECYCLE: 每个 Chromium 进程最多分配多少个账号上下文后重启 (可选，默认 20，0 为不重启)
+    XSERVER_TABS: 同一账号下多台 VPS 同时处理的标签页数 (可选，默认 2)
+    XSERVER_CDP_URL: 连接常驻浏览器 (--daemon) 的 CDP 地址，如 http://127.0.0.1:9222 (可选，连接失败时自行启动 Chromium)
+    XSERVER_CDP_PORT / XSERVER_DISPLAY: --daemon 模式的调试端口和 Xvfb 显示器 (可选，默认 9222 / :99)
+    XSERVER_DAEMON_MAX_RSS_MB: --daemon 模式下 Chromium 进程树内存超过该值时重启 (可选，默认 1500)
+    XSERVER_DAEMON_CHECK_SECONDS: --daemon 模式的健康检查间隔 (可选，默认 30)
+    XSERVER_SKIP_MARGIN_DAYS: 续期窗口之外再提前多少天开始检查 (可选，默认 1)
+    XSERVER_RECHECK_HOURS: 即使未到期，距上次检查超过多少小时也强制重新检查 (可选，默认 72)
+    XSERVER_SCHEDULE_JITTER_MINUTES: --schedule 模式下每个账号检查时间的随机偏移上限 (可选，默认 60)
+    XSERVER_RETRY_MINUTES / XSERVER_RETRY_MAX_HOURS: --schedule 模式下失败重试的初始间隔和上限，按 2 倍退避 (可选，默认 15 / 4)
+    XSERVER_STAGE_RETRIES: 单次运行内各阶段的重试次数，如 ocr=3,turnstile=2,submit=2 (可选，未写的阶段用默认值)
+    XSERVER_RETRY_BACKOFF: 单次运行内阶段重试的初始退避秒数，按 2 倍递增 (可选，默认 2)
+    XSERVER_HTTP_FASTPATH: 先用已保存的会话通过 HTTP 检查到期时间，不需要续期时不启动浏览器 (可选，默认 1)
+    XSERVER_BLOCK_RESOURCES: 按页面类型屏蔽字体、媒体、图片和统计脚本 (可选，默认 1)
+    XSERVER_DEBUG_MAX_MB: debug/ 目录的大小上限 (可选，默认 200)
+    XSERVER_DEBUG_MAX_AGE_DAYS: debug/ 中文件的保留天数 (可选，默认 14)
+    XSERVER_DEBUG_SUCCESS_SAMPLE: 正常流程 (提交前后) 截图的采样比例 0~1 (可选，默认 0；失败截图总是保存)
+    XSERVER_TRACE: 设为 1 时为每个账号录制 Playwright trace，只保留失败或过慢的账号 (可选，默认 0)
+    XSERVER_TRACE_SLOW_SECONDS: 账号耗时超过该秒数时也保留 trace (可选，默认 300，0 为只保留失败)
+    XSERVER_TRACE_KEEP: debug/ 中最多保留的 trace 数 (可选，默认 20)
+    XSERVER_METRICS_FILE: 每个账号各阶段耗时的 JSON-lines 输出文件 (可选，默认 metrics.jsonl，留空关闭)
+    XSERVER_PROM_FILE: node_exporter textfile collector 的 .prom 输出文件 (可选，默认不输出)
+    XSERVER_ACCOUNT_INTERVAL: 每个并发槽处理完一个账号后的间隔秒数 (可选，默认 3)
+    XSERVER_HEADLESS: 以 headless 模式启动 Chromium (可选，默认 0；Turnstile 需要非 headless)
+    XSERVER_BASE_URL / YESCAPTCHA_API_URL / TELEGRAM_API_URL: 覆盖各服务地址，用于离线基准测试 (可选)
+    XSERVER_DATA_DIR: sessions/、debug/、state.db、metrics.jsonl 的存放目录 (可选，默认当前工作目录)
+
+重要: XServer 的 Turnstile 在 xvfb 虚拟显示器环境无法自动通过，
+      必须配置 YESCAPTCHA_KEY 使用打码平台解决。
+"""
+
+import os
+import re
+import sys
+import asyncio
+import argparse
+import contextvars
+import json
+import sqlite3
+import time
+import base64
+import html
+import gzip
+import random
+import uuid
+import csv
+import hashlib
+import heapq
+import shutil
+import signal
+import socket
+import tempfile
+import multiprocessing
+import cProfile
+import pstats
+from collections import Counter
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, asynccontextmanager, nullcontext
+from pathlib import Path
+from urllib.parse import urlsplit, urljoin, parse_qs
+from datetime import datetime, date, timedelta
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python 3.10
+    tomllib = None
+
+# ==================== 配置 ====================
+# 只有命令行使用的配置；库调用相关的配置见 Settings
+ACCOUNTS_STR = os.environ.get('XSERVER_ACCOUNT', '')
+ACCOUNTS_FILE = os.environ.get('XSERVER_ACCOUNTS_FILE', '')
+SHARD = os.environ.get('XSERVER_SHARD', '')
+WORKERS = int(os.environ.get('XSERVER_WORKERS', '') or 1)
+PROCESSES = int(os.environ.get('XSERVER_PROCESSES', '') or 1)
+CDP_PORT = int(os.environ.get('XSERVER_CDP_PORT', '') or 9222)
+DAEMON_MAX_RSS_MB = float(os.environ.get('XSERVER_DAEMON_MAX_RSS_MB', '') or 1500)
+DAEMON_CHECK_SECONDS = float(os.environ.get('XSERVER_DAEMON_CHECK_SECONDS', '') or 30)
+RENEW_WINDOW_DAYS = 1  # XServer 免费 VPS 只能在到期前 1 天续期
+TURNSTILE_SITEKEY = '0x4AAAAAABlb1fIlWBrSDU3B'
+# 单次运行内每台 VPS 各阶段的重试次数，可用 XSERVER_STAGE_RETRIES="ocr=3,turnstile=2" 覆盖
+DEFAULT_STAGE_RETRIES = {'login': 1, 'detail': 1, 'extend': 2, 'ocr': 2, 'turnstile': 2, 'submit': 2, 'verify': 2}
+
+@dataclass
+class Settings:
+    """一次运行 (或一次库调用) 的配置
+    
+    Settings.from_env() 在调用时读取环境变量；库调用可直接构造，如
+    Settings(data_dir=Path("/var/lib/xserver"), yescaptcha_key="...")，未给出的字段使用默认值。
+    """
+    base_url: str = "https://secure.xserver.ne.jp"
+    data_dir: Path = field(default_factory=Path.cwd)
+    metrics_file: str = None  # None 为 data_dir/metrics.jsonl，'' 为不输出
+    prom_file: str = ''
+    captcha_api_url: str = 'https://captcha-120546510085.asia-northeast1.run.app'
+    yescaptcha_key: str = ''
+    yescaptcha_api_url: str = "https://api.yescaptcha.com"
+    telegram_bot_token: str = ''
+    telegram_chat_id: str = ''
+    telegram_api_url: str = "https://api.telegram.org"
+    stage_retries: str = ''
+    retry_backoff: float = 2
+    http_fastpath: bool = True
+    block_resources: bool = True
+    headless: bool = False
+    tabs: int = 2
+    browser_recycle: int = 20
+    cdp_url: str = ''
+    xvfb_display: str = ':99'
+    nav_cache: bool = True
+    nav_cache_hours: float = 168
+    lease_ttl: float = 600
+    account_interval: float = 3
+    account_min_seconds: float = 60
+    run_budget: float = 0
+    mem_limit_mb: float = 0
+    min_free_mb: float = 300
+    skip_margin_days: int = 1
+    recheck_hours: float = 72
+    schedule_jitter_minutes: float = 60
+    retry_minutes: float = 15
+    retry_max_hours: float = 4
+    debug_max_mb: float = 200
+    debug_max_age_days: float = 14
+    debug_success_sample: float = 0
+    trace: bool = False
+    trace_slow_seconds: float = 300
+    trace_keep: int = 20
+    
+    @classmethod
+    def from_env(cls, environ=None):
+        """从环境变量 (默认 os.environ) 读取，未设置或为空的变量使用默认值"""
+        env = os.environ if environ is None else environ
+        d = cls()
+        
+        def get(name, default, cast=str):
+            value = env.get(name, '')
+            return cast(value) if value else default
+        
+        return cls(
+            base_url=get('XSERVER_BASE_URL', d.base_url),
+            data_dir=get('XSERVER_DATA_DIR', d.data_dir, Path),
+            metrics_file=env.get('XSERVER_METRICS_FILE'),
+            prom_file=env.get('XSERVER_PROM_FILE', ''),
+            captcha_api_url=env.get('CAPTCHA_API_URL', d.captcha_api_url),
+            yescaptcha_key=env.get('YESCAPTCHA_KEY', ''),
+            yescaptcha_api_url=get('YESCAPTCHA_API_URL', d.yescaptcha_api_url),
+            telegram_bot_token=env.get('TELEGRAM_BOT_TOKEN', ''),
+            telegram_chat_id=env.get('TELEGRAM_CHAT_ID', ''),
+            telegram_api_url=get('TELEGRAM_API_URL', d.telegram_api_url),
+            stage_retries=env.get('XSERVER_STAGE_RETRIES', ''),
+            retry_backoff=get('XSERVER_RETRY_BACKOFF', d.retry_backoff, float),
+            http_fastpath=env.get('XSERVER_HTTP_FASTPATH', '1') != '0',
+            block_resources=env.get('XSERVER_BLOCK_RESOURCES', '1') != '0',
+            headless=env.get('XSERVER_HEADLESS', '0') == '1',
+            tabs=get('XSERVER_TABS', d.tabs, int),
+            browser_recycle=get('XSERVER_BROWSER_RECYCLE', d.browser_recycle, int),
+            cdp_url=env.get('XSERVER_CDP_URL', ''),
+            xvfb_display=get('XSERVER_DISPLAY', d.xvfb_display),
+            nav_cache=env.get('XSERVER_NAV_CACHE', '1') != '0',
+            nav_cache_hours=get('XSERVER_NAV_CACHE_HOURS', d.nav_cache_hours, float),
+            lease_ttl=get('XSERVER_LEASE_TTL', d.lease_ttl, float),
+            account_interval=get('XSERVER_ACCOUNT_INTERVAL', d.account_interval, float),
+            account_min_seconds=get('XSERVER_ACCOUNT_MIN_SECONDS', d.account_min_seconds, float),
+            run_budget=get('XSERVER_RUN_BUDGET', d.run_budget, float),
+            mem_limit_mb=get('XSERVER_MEM_LIMIT_MB', d.mem_limit_mb, float),
+            min_free_mb=get('XSERVER_MIN_FREE_MB', d.min_free_mb, float),
+            skip_margin_days=get('XSERVER_SKIP_MARGIN_DAYS', d.skip_margin_days, int),
+            recheck_hours=get('XSERVER_RECHECK_HOURS', d.recheck_hours, float),
+            schedule_jitter_minutes=get('XSERVER_SCHEDULE_JITTER_MINUTES', d.schedule_jitter_minutes, float),
+            retry_minutes=get('XSERVER_RETRY_MINUTES', d.retry_minutes, float),
+            retry_max_hours=get('XSERVER_RETRY_MAX_HOURS', d.retry_max_hours, float),
+            debug_max_mb=get('XSERVER_DEBUG_MAX_MB', d.debug_max_mb, float),
+            debug_max_age_days=get('XSERVER_DEBUG_MAX_AGE_DAYS', d.debug_max_age_days, float),
+            debug_success_sample=get('XSERVER_DEBUG_SUCCESS_SAMPLE', d.debug_success_sample, float),
+            trace=env.get('XSERVER_TRACE', '0') == '1',
+            trace_slow_seconds=get('XSERVER_TRACE_SLOW_SECONDS', d.trace_slow_seconds, float),
+            trace_keep=get('XSERVER_TRACE_KEEP', d.trace_keep, int),
+        )
+    
+    @property
+    def login_url(self):
+        return f"{self.base_url}/xapanel/login/xserver/"
+    
+    @property
+    def vps_index_url(self):
+        return f"{self.base_url}/xapanel/xvps/index"
+    
+    @property
+    def session_dir(self):
+        return Path(self.data_dir) / "sessions"
+    
+    @property
+    def debug_dir(self):
+        return Path(self.data_dir) / "debug"
+    
+    @property
+    def state_db(self):
+        return Path(self.data_dir) / "state.db"
+    
+    @property
+    def metrics_path(self):
+        return str(Path(self.data_dir) / "metrics.jsonl") if self.metrics_file is None else self.metrics_file
+
+# 命令行使用的配置 (导入时读取)；库调用未传入 settings 时在调用时重新读取环境变量
+SETTINGS = Settings.from_env()
+
+BROWSER_ARGS = ['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage',
+                '--disable-blink-features=AutomationControlled']
+CONTEXT_OPTIONS = {
+    'viewport': {'width': 1280, 'height': 900},
+    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+}
+
+# 正常流程中的截图阶段，按 XSERVER_DEBUG_SUCCESS_SAMPLE 采样；其他阶段都是失败截图
+SUCCESS_STAGES = {'before_submit', 'after_submit'}
+
+# 各类页面屏蔽的资源类型；验证码图片是 data:image 不经过网络，不受影响
+BLOCK_POLICY = {
+    'login': {'font', 'media', 'image'},
+    'index': {'font', 'media', 'image'},
+    'detail': {'font', 'media', 'image'},
+    'extend': {'font', 'media', 'image'},
+}
+# 任何页面都屏蔽的统计/广告域名
+BLOCKED_DOMAINS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'googleadservices.com', 'facebook.net', 'facebook.com', 'ads-twitter.com', 'clarity.ms',
+    'hotjar.com', 'bat.bing.com', 'criteo.com', 'criteo.net', 'yjtag.jp', 'yimg.jp', 'ladsp.com',
+)
+# 始终放行 (Turnstile)
+ALLOWED_DOMAINS = ('challenges.cloudflare.com',)
+
+# 各类就绪条件的超时 (毫秒)
+WAIT_TIMEOUTS = {
+    'goto': 60000,       # 页面导航 (DOMContentLoaded)
+    'idle': 5000,        # 导航后等待网络空闲，超时不视为失败
+    'url': 15000,        # 等待 URL 变化 (登录/提交跳转)
+    'selector': 10000,   # 等待元素出现
+    'turnstile': 10000,  # 等待 Turnstile 自动完成
+}
+
+# ==================== 工具函数 ====================
+# 并发时每个任务各自的账号标识，用于区分交错的日志
+_log_account = contextvars.ContextVar('log_account', default='')
+# 当前任务的阶段计时器，供深层函数记录重试次数
+_stage_timer = contextvars.ContextVar('stage_timer', default=None)
+# 当前运行的时间预算 (RunDeadline)，供深层的等待限制超时
+_deadline = contextvars.ContextVar('deadline', default=None)
+# 当前运行的配置 (Settings)，供深层函数读取；未设置时为 SETTINGS
+_settings = contextvars.ContextVar('settings', default=None)
+
+def current_settings():
+    """当前任务的配置"""
+    return _settings.get() or SETTINGS
+
+class Logger:
+    stream = None  # None 为 stdout；输出 JSON 报告时改为 stderr
+    process = ''   # --processes 的工作进程编号，区分各进程交错的日志
+    
+    @staticmethod
+    def log(tag, msg, icon="ℹ"):
+        icons = {"OK": "✓", "WARN": "⚠", "WAIT": "⏳", "INFO": "ℹ"}
+        account = _log_account.get()
+        prefix = (f"[{Logger.process}] " if Logger.process else "") + (f"[{account}] " if account else "")
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] {prefix}[{tag}] {icons.get(icon, icon)} {msg}",
+              file=Logger.stream or sys.stdout, flush=bool(Logger.process))
+
+class HttpClient:
+    """整个运行共享的异步 HTTP 客户端
+    
+    同一主机的连接保持复用；失败时用 asyncio.sleep 指数退避重试，
+    调用方任务被取消时请求随之取消。
+    """
+    def __init__(self, limit_per_host=8, keepalive=30, session=None):
+        self.limit_per_host = limit_per_host
+        self.keepalive = keepalive
+        # 调用方传入的 aiohttp.ClientSession 只借用其连接池，不使用它的 cookie jar，也不关闭它
+        self._shared = session
+        self._session = None
+    
+    @property
+    def session(self):
+        import aiohttp
+        if self._session is None or self._session.closed:
+            if self._shared is not None:
+                connector, owner = self._shared.connector, False
+            else:
+                connector = aiohttp.TCPConnector(limit_per_host=self.limit_per_host, keepalive_timeout=self.keepalive)
+                owner = True
+            # 不共享 cookie，避免账号之间互相串号 (服务器轮换的 cookie 不能覆盖按账号设置的 Cookie 头)
+            self._session = aiohttp.ClientSession(connector=connector, connector_owner=owner,
+                                                  cookie_jar=aiohttp.DummyCookieJar())
+        return self._session
+    
+    async def _send(self, method, url, *, timeout=30, retries=2, backoff=1.0, parse='text', **kwargs):
+        import aiohttp
+        for attempt in range(retries + 1):
+            try:
+                async with self.session.request(method, url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs) as r:
+                    if parse == 'json':
+                        body = await r.json(content_type=None)
+                    else:
+                        body = await r.text()
+                    return r.status, body, str(r.url)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt >= retries:
+                    raise
+                note_retry()
+                await asyncio.sleep(backoff * 2 ** attempt)
+    
+    async def request(self, method, url, **kwargs):
+        """发送请求并返回 (状态码, 内容)，网络错误按 backoff * 2^n 秒退避重试"""
+        status, body, _ = await self._send(method, url, **kwargs)
+        return status, body
+    
+    async def get_page(self, url, **kwargs):
+        """GET 页面并跟随跳转，返回 (状态码, HTML, 最终 URL)"""
+        return await self._send('GET', url, **kwargs)
+    
+    async def post_text(self, url, **kwargs):
+        return (await self.request('POST', url, **kwargs))[1]
+    
+    async def post_json(self, url, **kwargs):
+        return (await self.request('POST', url, parse='json', **kwargs))[1]
+    
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+class StageTimer:
+    """记录单个账号各阶段的耗时、重试次数和结果
+    
+    stage() 开始新阶段时上一个阶段以 ok 结束；end() 以给定结果结束最后一个阶段。
+    """
+    def __init__(self, email):
+        self.email = email
+        self.stages = []
+        self.started_at = datetime.now()
+        self._start = time.monotonic()
+        self._current = None
+        self.total = None
+    
+    def stage(self, name):
+        self._close('ok')
+        self._current = {'stage': name, 'seconds': 0.0, 'retries': 0, 'outcome': None, '_t': time.monotonic()}
+    
+    @contextmanager
+    def span(self, name):
+        self.stage(name)
+        try:
+            yield
+        except BaseException:
+            self._close('error')
+            raise
+        self._close('ok')
+    
+    def fail(self):
+        """以 error 结束当前阶段，用于阶段失败后重试的情况"""
+        self._close('error')
+    
+    @property
+    def current_stage(self):
+        """正在计时的阶段名，没有时为 None"""
+        return self._current['stage'] if self._current else None
+    
+    def retry(self, n=1):
+        if self._current:
+            self._current['retries'] += n
+    
+    def _close(self, outcome):
+        cur = self._current
+        if cur:
+            cur['seconds'] = round(time.monotonic() - cur.pop('_t'), 3)
+            cur['outcome'] = outcome
+            self.stages.append(cur)
+            self._current = None
+    
+    def end(self, outcome):
+        self._close(outcome)
+        self.total = round(time.monotonic() - self._start, 3)
+    
+    def fork(self):
+        """结束当前阶段，派生一个带有已完成阶段、起始时间相同的计时器
+        
+        同一账号的多台 VPS 并行处理时各用一个，登录等公共阶段会出现在每台 VPS 的记录中。
+        """
+        self._close('ok')
+        child = StageTimer(self.email)
+        child.stages = list(self.stages)
+        child.started_at = self.started_at
+        child._start = self._start
+        return child
+    
+    def summary(self):
+        return {'started_at': self.started_at.isoformat(timespec='seconds'), 'total': self.total, 'stages': self.stages}
+
+def note_retry():
+    """给当前任务正在进行的阶段记一次重试"""
+    timer = _stage_timer.get()
+    if timer:
+        timer.retry()
+
+def parse_accounts(s):
+    accounts = []
+    for item in (s or '').split('&'):
+        item = item.strip()
+        if ':' in item:
+            email, password = item.split(':', 1)
+            accounts.append({'email': email.strip(), 'password': password.strip()})
+    return accounts
+
+JP_DATE_RE = re.compile(r'(\d{4})\s*[年/\-]\s*(\d{1,2})\s*[月/\-]\s*(\d{1,2})\s*日?')
+
+def parse_jp_date(s: str):
+    """解析日文日期格式为 date 对象"""
+    if not s:
+        return None
+    s = s.strip()
+    m = JP_DATE_RE.search(s)
+    if not m:
+        return None
+    y, mo, d = map(int, m.groups())
+    try:
+        return date(y, mo, d)
+    except:
+        return None
+
+# 一次 evaluate 取回续期流程各页面需要的全部信息，减少 CDP 往返
+PAGE_SNAPSHOT_JS = r"""
+() => {
+  const textOf = (el) => (el && el.innerText ? el.innerText.trim() : "");
+  const snap = {url: location.href};
+
+  // 到期时间: 表格行 → dt/dd → 全文
+  const keywords = ["有効期限", "期限"];
+  snap.expireText = null;
+  for (const tr of document.querySelectorAll("tr")) {
+    if (keywords.some(k => textOf(tr).includes(k))) {
+      const td = tr.querySelector("td");
+      if (td) { snap.expireText = textOf(td); break; }
+    }
+  }
+  if (snap.expireText === null) {
+    for (const dt of document.querySelectorAll("dt")) {
+      if (keywords.some(k => textOf(dt).includes(k)) && dt.nextElementSibling) {
+        snap.expireText = textOf(dt.nextElementSibling); break;
+      }
+    }
+  }
+  if (snap.expireText === null) snap.expireText = document.body ? document.body.innerText || "" : "";
+
+  // 链接
+  snap.detailHrefs = Array.from(document.querySelectorAll('a[href*="server/detail"]'))
+    .map(a => a.getAttribute('href')).filter((h, i, all) => h && all.indexOf(h) === i);
+  const extend = document.querySelector('a[href*="extend"]');
+  snap.extendHref = extend ? extend.getAttribute('href') : null;
+  snap.hasFreeVpsButton = Array.from(document.querySelectorAll('button, a'))
+    .some(el => (el.innerText || '').includes('無料VPS'));
+
+  // 验证码图片 (data:image，带 border 样式)
+  snap.captcha = null;
+  for (const img of document.querySelectorAll('img[src^="data:image"], img[style*="border"], img[src*="captcha"], img')) {
+    if (img.src && img.src.startsWith('data:image')) { snap.captcha = img.src; break; }
+  }
+
+  // 验证码输入框候选 (按优先级，只返回页面上存在的选择器)
+  snap.inputs = [
+    'input[name*="captcha"]', 'input[id*="captcha"]', 'input[placeholder*="数字"]',
+    'input[placeholder*="入力"]', 'input[placeholder*="認証"]', 'input[type="text"][class*="captcha"]',
+    'input[type="text"]',
+  ].filter(sel => document.querySelector(sel));
+
+  // 提交按钮
+  let submitBtn = document.querySelector('input[type="submit"], button[type="submit"]');
+  if (!submitBtn) {
+    submitBtn = Array.from(document.querySelectorAll('button'))
+      .find(b => b.innerText.includes('継続') || b.innerText.includes('確認'));
+  }
+  snap.submit = null;
+  for (const sel of ['input[type="submit"]:not([disabled])', 'button[type="submit"]:not([disabled])']) {
+    const btn = document.querySelector(sel);
+    if (btn) {
+      snap.submit = {selector: sel, text: btn.tagName === 'BUTTON' ? btn.innerText : btn.getAttribute('value')};
+      break;
+    }
+  }
+
+  // Turnstile
+  const widget = document.querySelector('.cf-turnstile');
+  const responseInput = document.querySelector('input[name="cf-turnstile-response"], textarea[name="cf-turnstile-response"]');
+  const rect = widget ? widget.getBoundingClientRect() : null;
+  snap.turnstile = {
+    hasTurnstile: !!widget,
+    responseLen: responseInput ? responseInput.value.length : 0,
+    submitDisabled: submitBtn ? submitBtn.disabled : null,
+    rect: rect ? {x: rect.x, y: rect.y, width: rect.width, height: rect.height} : null,
+  };
+  return snap;
+}
+"""
+
+async def take_snapshot(page):
+    """一次往返获取页面的结构化快照 (到期时间文本、链接、验证码、输入框、Turnstile、提交按钮)"""
+    return await page.evaluate(PAGE_SNAPSHOT_JS)
+
+EXPIRE_PATTERNS = [re.compile(p) for p in (
+    r'有効期限[：: ]*\s*([0-9]{4}[年/\-][0-9]{1,2}[月/\-][0-9]{1,2}日?)',
+    r'期限[：: ]*\s*([0-9]{4}[年/\-][0-9]{1,2}[月/\-][0-9]{1,2}日?)',
+    r'([0-9]{4}年[0-9]{1,2}月[0-9]{1,2}日)\s*まで',
+    r'([0-9]{4}[/-][0-9]{1,2}[/-][0-9]{1,2})',
+)]
+
+def parse_expire_text(text):
+    """从页面文本中解析到期日期"""
+    for p in EXPIRE_PATTERNS:
+        m = p.search(text)
+        if m:
+            return parse_jp_date(m.group(1))
+    return parse_jp_date(text)
+
+class ArtifactWriter:
+    """后台写入调试截图和 HTML
+    
+    页面内容在调用时抓取，写盘、gzip 压缩和清理都在后台任务中进行；
+    debug/ 目录按保留天数和总大小淘汰旧文件，优先淘汰正常流程的截图。
+    """
+    def __init__(self, directory=None, max_mb=None, max_age_days=None, success_sample=None, queue_size=32,
+                 settings=None):
+        s = settings or current_settings()
+        self.directory = Path(s.debug_dir if directory is None else directory)
+        self.max_bytes = int((s.debug_max_mb if max_mb is None else max_mb) * 1024 * 1024)
+        self.max_age = (s.debug_max_age_days if max_age_days is None else max_age_days) * 86400
+        self.success_sample = s.debug_success_sample if success_sample is None else success_sample
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.written = 0
+        self.dropped = 0
+        self._seq = 0
+        self._task = None
+    
+    async def capture(self, page, email, stage):
+        """抓取当前页面并排队写入；正常流程阶段按采样比例保存，队列满时丢弃"""
+        optional = stage in SUCCESS_STAGES
+        if optional and random.random() >= self.success_sample:
+            return
+        self._seq += 1
+        prefix = f"{email}_{stage}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self._seq}"
+        try:
+            screenshot = await page.screenshot()
+            page_html = await page.content()
+        except Exception as e:
+            Logger.log("调试", f"抓取失败: {e}", "WARN")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        item = (prefix, screenshot, page_html)
+        if optional:
+            try:
+                self.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                return
+        else:
+            await self.queue.put(item)
+        Logger.log("调试", f"已排队保存截图和HTML: {prefix}", "INFO")
+    
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                await asyncio.to_thread(self._write, *item)
+                self.written += 1
+            except Exception as e:
+                Logger.log("调试", f"保存失败: {e}", "WARN")
+            finally:
+                self.queue.task_done()
+    
+    def _write(self, prefix, screenshot, page_html):
+        self.directory.mkdir(exist_ok=True)
+        (self.directory / f"{prefix}.png").write_bytes(screenshot)
+        with gzip.open(self.directory / f"{prefix}.html.gz", 'wt', encoding='utf-8') as f:
+            f.write(page_html)
+        self.prune()
+    
+    def prune(self):
+        """删除超过保留天数的文件，再从最旧的文件开始删除直到总大小低于上限"""
+        if not self.directory.exists():
+            return
+        now = time.time()
+        files = []
+        for path in self.directory.iterdir():
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if not path.is_file():
+                continue
+            if self.max_age and now - st.st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                continue
+            optional = any(f"_{stage}_" in path.name for stage in SUCCESS_STAGES)
+            files.append((not optional, st.st_mtime, st.st_size, path))
+        total = sum(f[2] for f in files)
+        for _, _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+    
+    async def close(self):
+        """等待队列写完后停止后台任务"""
+        if self._task is not None:
+            await self.queue.join()
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self.prune)
+
+class TraceRecorder:
+    """按账号录制 Playwright trace (截图、DOM 快照、网络)，只保留失败或过慢的账号
+    
+    trace 在录制期间由 Playwright 驱动暂存，账号正常且不超过 slow_seconds 时直接丢弃，
+    不写盘；保留的 trace 写入 debug/，最多保留 keep 个，同时受 ArtifactWriter 的总大小上限约束。
+    """
+    def __init__(self, artifacts, enabled=None, slow_seconds=None, keep=None, settings=None):
+        s = settings or current_settings()
+        self.artifacts = artifacts
+        self.enabled = s.trace if enabled is None else enabled
+        self.slow_seconds = s.trace_slow_seconds if slow_seconds is None else slow_seconds
+        self.keep = s.trace_keep if keep is None else keep
+        self.kept = 0
+        self.discarded = 0
+        self._started = {}
+    
+    async def start(self, context):
+        if not self.enabled:
+            return
+        try:
+            await context.tracing.start(screenshots=True, snapshots=True, sources=False)
+            self._started[context] = time.monotonic()
+        except Exception as e:
+            Logger.log("追踪", f"无法开始录制: {e}", "WARN")
+    
+    def keep_reason(self, results, elapsed):
+        """需要保留 trace 时返回原因，否则返回 None"""
+        failed = [r for r in results if result_outcome(r) == 'failed']
+        if failed:
+            return f"失败: {failed[0].get('msg', '')[:40]}"
+        if self.slow_seconds and elapsed > self.slow_seconds:
+            return f"耗时 {elapsed:.0f}s 超过 {self.slow_seconds:.0f}s"
+        return None
+    
+    async def finish(self, context, email, results):
+        """结束录制，按结果决定保存还是丢弃"""
+        started = self._started.pop(context, None)
+        if started is None:
+            return
+        reason = self.keep_reason(results, time.monotonic() - started)
+        try:
+            if reason is None:
+                await context.tracing.stop()
+                self.discarded += 1
+                return
+            self.artifacts.directory.mkdir(exist_ok=True)
+            path = self.artifacts.directory / f"{email}_trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+            await context.tracing.stop(path=str(path))
+        except Exception as e:
+            Logger.log("追踪", f"结束录制失败: {e}", "WARN")
+            return
+        self.kept += 1
+        Logger.log("追踪", f"已保存 trace ({reason}): {path.name}，用 playwright show-trace 查看", "INFO")
+        await asyncio.to_thread(self.prune)
+    
+    def prune(self):
+        traces = sorted(self.artifacts.directory.glob("*_trace_*.zip"), key=lambda p: p.stat().st_mtime)
+        for path in traces[:max(0, len(traces) - self.keep)]:
+            path.unlink(missing_ok=True)
+        self.artifacts.prune()
+
+async def save_debug_info(rt, page, email, stage):
+    """保存调试信息"""
+    await rt.artifacts.capture(page, email, stage)
+
+class Readiness:
+    """基于真实页面条件的等待层，代替固定 sleep
+    
+    每个等待都有独立超时，超时返回 False 而不抛异常，由调用方决定如何处理 (页面导航超时仍抛出)；
+    每次等待 (包括导航) 的耗时记录在 timings 中。
+    """
+    def __init__(self, page, timeouts=None):
+        self.page = page
+        self.timeouts = {**WAIT_TIMEOUTS, **(timeouts or {})}
+        self.timings = []
+    
+    async def _timed(self, name, awaitable, raise_timeout=False):
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+        start = time.monotonic()
+        ok = False
+        try:
+            await awaitable
+            ok = True
+        except PlaywrightTimeoutError:
+            if raise_timeout:
+                raise
+        finally:
+            self.timings.append({'wait': name, 'seconds': round(time.monotonic() - start, 3), 'ok': ok})
+        return ok
+    
+    @property
+    def total(self):
+        return sum(t['seconds'] for t in self.timings)
+    
+    @staticmethod
+    def _limit(timeout):
+        """超时 (毫秒) 不超过运行预算的剩余时间；Playwright 中 0 表示不限时，因此至少 1 毫秒"""
+        return max(1, deadline_cap(timeout / 1000) * 1000)
+    
+    async def goto(self, url):
+        """导航到 url，等待 DOMContentLoaded 后再短暂等待网络空闲"""
+        await self._timed("goto", self.page.goto(url, timeout=self._limit(self.timeouts['goto']),
+                                                 wait_until='domcontentloaded'), raise_timeout=True)
+        await self.network_idle()
+    
+    async def load_state(self, state='load', timeout=None):
+        return await self._timed(f"load:{state}", self.page.wait_for_load_state(
+            state, timeout=self._limit(timeout or self.timeouts['goto'])))
+    
+    async def network_idle(self, timeout=None):
+        return await self._timed("networkidle", self.page.wait_for_load_state(
+            'networkidle', timeout=self._limit(timeout or self.timeouts['idle'])))
+    
+    async def url_change(self, old_url, timeout=None):
+        """等待 URL 离开 old_url (表单提交/跳转)"""
+        return await self._timed("url", self.page.wait_for_url(
+            lambda url: url != old_url, wait_until='domcontentloaded',
+            timeout=self._limit(timeout or self.timeouts['url'])))
+    
+    async def selector(self, selector, state='visible', timeout=None):
+        return await self._timed(f"selector:{selector}", self.page.wait_for_selector(
+            selector, state=state, timeout=self._limit(timeout or self.timeouts['selector'])))
+    
+    async def function(self, name, js, timeout=None):
+        """等待页面内 js 条件成立"""
+        return await self._timed(name, self.page.wait_for_function(
+            js, timeout=self._limit(timeout or self.timeouts['selector'])))
+    
+    async def response(self, name, predicate, timeout=None):
+        """等待满足 predicate 的网络响应 (需在触发请求前创建任务)"""
+        return await self._timed(name, self.page.wait_for_event(
+            'response', predicate, timeout=self._limit(timeout or self.timeouts['url'])))
+
+async def cdp_click(cdp, x, y):
+    """CDP 模拟点击"""
+    await cdp.send('Input.dispatchMouseEvent', {
+        'type': 'mousePressed', 'x': x, 'y': y, 'button': 'left', 'clickCount': 1
+    })
+    await asyncio.sleep(0.05)
+    await cdp.send('Input.dispatchMouseEvent', {
+        'type': 'mouseReleased', 'x': x, 'y': y, 'button': 'left', 'clickCount': 1
+    })
+
+async def ocr_captcha(http, img_data_url, max_retries=3):
+    """调用 OCR API 识别日文验证码"""
+    if not img_data_url:
+        Logger.log("OCR", "未获取到验证码图片", "WARN")
+        return None
+    
+    try:
+        if img_data_url.startswith('data:'):
+            base64_data = img_data_url.split(',', 1)[1] if ',' in img_data_url else img_data_url
+        else:
+            base64_data = img_data_url
+        
+        for attempt in range(max_retries):
+            try:
+                Logger.log("OCR", f"尝试识别 (第{attempt+1}次)...", "WAIT")
+                text = await http.post_text(current_settings().captcha_api_url, data=base64_data,
+                                            headers={'Content-Type': 'text/plain'}, timeout=60, retries=0)
+                result = text.strip()
+                if result and len(result) >= 4:
+                    Logger.log("OCR", f"识别结果: {result}", "OK")
+                    return result
+                else:
+                    Logger.log("OCR", f"识别结果无效: {result}", "WARN")
+            except asyncio.TimeoutError:
+                Logger.log("OCR", f"第{attempt+1}次超时", "WARN")
+            except Exception as e:
+                Logger.log("OCR", f"第{attempt+1}次错误: {e}", "WARN")
+            if attempt + 1 < max_retries:
+                note_retry()
+                await asyncio.sleep(2 ** attempt)
+        
+        Logger.log("OCR", f"识别失败，已尝试{max_retries}次", "WARN")
+        return None
+    except Exception as e:
+        Logger.log("OCR", f"失败: {e}", "WARN")
+        return None
+
+async def fill_captcha(page, captcha_result, selectors):
+    """按快照中存在的输入框选择器依次填入验证码并校验"""
+    if not captcha_result:
+        return False
+    
+    for selector in selectors:
+        try:
+            locator = page.locator(selector).first
+            await locator.fill(captcha_result)
+            filled_value = await locator.input_value()
+            if filled_value == captcha_result:
+                Logger.log("验证码", f"已填入: {captcha_result} (选择器: {selector})", "OK")
+                return True
+            else:
+                Logger.log("验证码", f"填入校验失败: 期望 {captcha_result}, 实际 {filled_value}", "WARN")
+        except Exception:
+            continue
+    
+    Logger.log("验证码", "未找到验证码输入框", "WARN")
+    return False
+
+async def solve_turnstile_yescaptcha(http, url):
+    """使用 YesCaptcha 解决 Turnstile"""
+    s = current_settings()
+    if not s.yescaptcha_key:
+        Logger.log("Turnstile", "未配置 YESCAPTCHA_KEY，无法解决", "WARN")
+        return None
+    
+    Logger.log("Turnstile", "使用 YesCaptcha 解决...", "WAIT")
+    try:
+        data = await http.post_json(f"{s.yescaptcha_api_url}/createTask", json={
+            "clientKey": s.yescaptcha_key,
+            "task": {
+                "type": "TurnstileTaskProxyless",
+                "websiteURL": url,
+                "websiteKey": TURNSTILE_SITEKEY
+            }
+        }, timeout=30)
+        if data.get('errorId'):
+            Logger.log("Turnstile", f"创建任务失败: {data.get('errorDescription')}", "WARN")
+            return None
+        task_id = data.get('taskId')
+        Logger.log("Turnstile", f"任务 ID: {task_id}", "INFO")
+        
+        for i in range(60):
+            if deadline_cap(3) < 3:
+                Logger.log("Turnstile", "运行时间预算不足，停止等待 YesCaptcha", "WARN")
+                return None
+            await asyncio.sleep(3)
+            data = await http.post_json(f"{s.yescaptcha_api_url}/getTaskResult", json={
+                "clientKey": s.yescaptcha_key,
+                "taskId": task_id
+            }, timeout=30)
+            if data.get('status') == 'ready':
+                token = data['solution']['token']
+                Logger.log("Turnstile", f"成功! token 长度: {len(token)}", "OK")
+                return token
+            if data.get('errorId'):
+                Logger.log("Turnstile", f"错误: {data.get('errorDescription')}", "WARN")
+                return None
+            if i % 5 == 0:
+                Logger.log("Turnstile", f"等待中... ({i*3}s)", "WAIT")
+        
+        Logger.log("Turnstile", "YesCaptcha 超时", "WARN")
+        return None
+    except Exception as e:
+        Logger.log("Turnstile", f"YesCaptcha 错误: {e}", "WARN")
+        return None
+
+async def inject_turnstile_token(page, token):
+    """注入 Turnstile token 并触发事件和 callback"""
+    js = f'''
+    () => {{
+        let result = {{ found: false, callbackCalled: false }};
+        
+        // 找到所有 turnstile response 输入框并设置值
+        const selectors = [
+            'input[name="cf-turnstile-response"]',
+            'textarea[name="cf-turnstile-response"]',
+            'input[id*="turnstile"][id*="response"]',
+        ];
+        
+        for (const sel of selectors) {{
+            const elements = document.querySelectorAll(sel);
+            elements.forEach(el => {{
+                el.value = "{token}";
+                el.dispatchEvent(new Event('input', {{ bubbles: true }}));
+                el.dispatchEvent(new Event('change', {{ bubbles: true }}));
+                result.found = true;
+            }});
+        }}
+        
+        // 调用 Turnstile callback 函数 - 这是关键！
+        // XServer 使用 callbackTurnstile 函数
+        if (typeof window.callbackTurnstile === 'function') {{
+            try {{
+                window.callbackTurnstile("{token}");
+                result.callbackCalled = true;
+                console.log('callbackTurnstile called successfully');
+            }} catch (e) {{
+                console.log('callbackTurnstile error:', e);
+            }}
+        }}
+        
+        // 也尝试从 data-callback 属性获取回调名
+        const turnstileEl = document.querySelector('.cf-turnstile');
+        if (turnstileEl) {{
+            const callbackName = turnstileEl.getAttribute('data-callback');
+            if (callbackName && callbackName !== 'callbackTurnstile' && typeof window[callbackName] === 'function') {{
+                try {{
+                    window[callbackName]("{token}");
+                    result.callbackCalled = true;
+                }} catch (e) {{}}
+            }}
+        }}
+        
+        // 启用提交按钮
+        const submitBtns = document.querySelectorAll('input[type="submit"], button[type="submit"]');
+        submitBtns.forEach(btn => {{
+            btn.disabled = false;
+        }});
+        
+        // 获取最终 response 长度
+        const responseEl = document.querySelector('input[name="cf-turnstile-response"]');
+        result.valueLen = responseEl ? responseEl.value.length : 0;
+        
+        return result;
+    }}
+    '''
+    return await page.evaluate(js)
+
+# Turnstile 已通过: response 有值且提交按钮可用
+TURNSTILE_READY_JS = '''
+() => {
+    const responseInput = document.querySelector('input[name="cf-turnstile-response"], textarea[name="cf-turnstile-response"]');
+    if (!responseInput || responseInput.value.length <= 10) return false;
+    let submitBtn = document.querySelector('input[type="submit"], button[type="submit"]');
+    if (!submitBtn) {
+        const buttons = Array.from(document.querySelectorAll('button'));
+        submitBtn = buttons.find(b => b.innerText.includes('継続') || b.innerText.includes('確認'));
+    }
+    return !(submitBtn && submitBtn.disabled);
+}
+'''
+
+async def handle_turnstile(page, cdp, ready, http, status, max_wait=30):
+    """处理 Turnstile 验证，status 为页面快照中的 turnstile 部分"""
+    Logger.log("Turnstile", "检查验证状态...", "WAIT")
+    
+    Logger.log("Turnstile", f"状态: 存在={status.get('hasTurnstile')}, response长度={status.get('responseLen')}, 按钮disabled={status.get('submitDisabled')}", "INFO")
+    
+    if status.get('responseLen', 0) > 10 and not status.get('submitDisabled'):
+        Logger.log("Turnstile", "已有有效 token 且按钮可用", "OK")
+        return True
+    
+    if not status.get('hasTurnstile'):
+        Logger.log("Turnstile", "未找到 Turnstile 元素", "INFO")
+        return True
+    
+    # 首先尝试等待 Turnstile 自动完成（有时候只需要等待）
+    Logger.log("Turnstile", "等待 Turnstile 自动验证...", "WAIT")
+    if await ready.function("turnstile:auto", TURNSTILE_READY_JS, ready.timeouts['turnstile']):
+        Logger.log("Turnstile", "自动验证完成", "OK")
+        return True
+    
+    # 尝试点击 Turnstile iframe 内的复选框 (位置可能在等待期间变化，重新取快照)
+    turnstile = (await take_snapshot(page))['turnstile']['rect']
+    
+    if turnstile:
+        # 点击复选框区域（通常在左侧）
+        x = int(turnstile['x'] + 30)
+        y = int(turnstile['y'] + turnstile['height'] / 2)
+        Logger.log("Turnstile", f"尝试 CDP 点击复选框 ({x}, {y})", "INFO")
+        await cdp_click(cdp, x, y)
+        
+        Logger.log("Turnstile", f"等待验证中 (最多 {max_wait}s)...", "WAIT")
+        if await ready.function("turnstile:click", TURNSTILE_READY_JS, max_wait * 1000):
+            Logger.log("Turnstile", "CDP 点击成功，验证完成", "OK")
+            return True
+    
+    Logger.log("Turnstile", "CDP 点击未生效，使用 YesCaptcha", "INFO")
+    
+    token = await solve_turnstile_yescaptcha(http, page.url)
+    if token:
+        result = await inject_turnstile_token(page, token)
+        Logger.log("Turnstile", f"Token 注入结果: {result}", "INFO")
+        
+        if result.get('found'):
+            # 等待前端处理 token
+            if await ready.function("turnstile:inject", TURNSTILE_READY_JS, ready.timeouts['turnstile']):
+                Logger.log("Turnstile", "YesCaptcha token 注入成功，按钮已启用", "OK")
+                return True
+            status = (await take_snapshot(page))['turnstile']
+            Logger.log("Turnstile", f"注入后状态: response长度={status.get('responseLen')}, 按钮disabled={status.get('submitDisabled')}", "INFO")
+            
+            # 即使按钮还是 disabled，也尝试继续（可能前端逻辑问题）
+            if status.get('responseLen', 0) > 10:
+                Logger.log("Turnstile", "Token 已注入，但按钮仍 disabled，强制继续", "WARN")
+                return True
+            else:
+                Logger.log("Turnstile", "Token 注入但未生效", "WARN")
+        else:
+            Logger.log("Turnstile", "未找到 token 输入框", "WARN")
+    
+    Logger.log("Turnstile", "验证失败", "WARN")
+    return False
+
+def result_line(result):
+    """单条结果的一行摘要: 图标 账号 [#VPS]: 信息"""
+    icon = "✅" if result['success'] else "⏭" if result.get('skipped') else "❌"
+    name = f"{result['email']} #{result['vps']}" if result.get('vps') else result['email']
+    return f"{icon} {name}: {result['msg']}"
+
+class TelegramNotifier:
+    """后台发送 Telegram 通知的队列
+    
+    post() 只把文本放入队列，不阻塞续期流程；后台任务把已排队的文本合并，
+    按 4096 字符的上限在行边界切分后逐条发送，两条消息之间至少间隔 min_interval 秒。
+    429 按 retry_after 等待，网络错误和 5xx 指数退避重试，HTML 解析失败时改为纯文本。
+    退出前调用 flush() 等待队列发完。
+    """
+    LIMIT = 4096
+    
+    def __init__(self, http, token=None, chat_id=None, api_url=None, outcomes=None, min_interval=1.0,
+                 max_attempts=5, settings=None):
+        s = settings or current_settings()
+        self.http = http
+        self.token = s.telegram_bot_token if token is None else token
+        self.chat_id = s.telegram_chat_id if chat_id is None else chat_id
+        self.api_url = api_url or s.telegram_api_url
+        self.outcomes = outcomes
+        self.min_interval = min_interval
+        self.max_attempts = max_attempts
+        self.queue = asyncio.Queue()
+        self.sent = 0
+        self.failed = 0
+        self._next_at = 0.0
+        self._task = None
+    
+    @property
+    def enabled(self):
+        return bool(self.token and self.chat_id)
+    
+    def post(self, text):
+        if not self.enabled or not text:
+            return
+        self.queue.put_nowait(text)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    def post_results(self, results):
+        """账号处理完后立即推送其结果；设置了 outcomes 时只推送这些类别"""
+        lines = [html.escape(result_line(r)) for r in results
+                 if self.outcomes is None or result_outcome(r) in self.outcomes]
+        self.post("\n".join(lines))
+    
+    @classmethod
+    def chunks(cls, text, limit=None):
+        """按行切分成不超过 limit 字符的若干段，单行过长时硬切"""
+        limit = limit or cls.LIMIT
+        chunks, current = [], ""
+        for line in text.split("\n"):
+            while len(line) > limit:
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(line[:limit])
+                line = line[limit:]
+            if current and len(current) + 1 + len(line) > limit:
+                chunks.append(current)
+                current = line
+            else:
+                current = f"{current}\n{line}" if current else line
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    async def _run(self):
+        while True:
+            texts = [await self.queue.get()]
+            while not self.queue.empty():
+                texts.append(self.queue.get_nowait())
+            try:
+                for chunk in self.chunks("\n\n".join(texts)):
+                    await self._deliver(chunk)
+            except Exception as e:
+                Logger.log("通知", f"发送出错: {e}", "WARN")
+            finally:
+                for _ in texts:
+                    self.queue.task_done()
+    
+    async def _deliver(self, text):
+        loop = asyncio.get_running_loop()
+        url = f"{self.api_url}/bot{self.token}/sendMessage"
+        data = {"chat_id": self.chat_id, "text": text, "parse_mode": "HTML", "disable_web_page_preview": "true"}
+        error = None
+        for attempt in range(self.max_attempts):
+            wait = self._next_at - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                status, body = await self.http.request('POST', url, data=data, timeout=10, retries=0, parse='json')
+            except Exception as e:
+                status, body, error = None, None, str(e)[:100]
+            self._next_at = loop.time() + self.min_interval
+            body = body if isinstance(body, dict) else {}
+            if status == 200 and body.get('ok'):
+                self.sent += 1
+                return True
+            if status is not None:
+                error = f"HTTP {status}: {body.get('description', '')}"
+            if status == 429:
+                delay = (body.get('parameters') or {}).get('retry_after') or 2 ** attempt
+                Logger.log("通知", f"触发 Telegram 限流，{delay} 秒后重试", "WARN")
+            elif status == 400 and 'parse_mode' in data:
+                data.pop('parse_mode')
+                continue
+            elif status is not None and status < 500:
+                break
+            else:
+                delay = 2 ** attempt
+            await asyncio.sleep(delay)
+        self.failed += 1
+        Logger.log("通知", f"发送失败: {error}", "WARN")
+        return False
+    
+    async def flush(self, timeout=60):
+        """等待队列中的消息发完 (最多 timeout 秒) 后停止后台任务"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            Logger.log("通知", f"等待超时，{self.queue.qsize()} 条消息未发送", "WARN")
+        self._task.cancel()
+        self._task = None
+
+# ==================== 资源拦截 ====================
+def page_type(url):
+    """根据 URL 判断页面类型，对应 BLOCK_POLICY 的键"""
+    if 'extend' in url:
+        return 'extend'
+    if 'server/detail' in url:
+        return 'detail'
+    if 'login' in url:
+        return 'login'
+    return 'index'
+
+def _host_matches(host, domains):
+    return any(host == d or host.endswith('.' + d) for d in domains)
+
+class ResourceBlocker:
+    """按页面类型拦截不需要的请求，并统计拦截数量和大致的下载字节数
+    
+    被拦截的请求从未下载，无法得知其大小，因此只统计数量。下载字节数按响应的
+    Content-Length 累加，分块传输或没有该响应头的响应不计入，因此只是下限。
+    """
+    def __init__(self, policy=BLOCK_POLICY, blocked_domains=BLOCKED_DOMAINS, allowed_domains=ALLOWED_DOMAINS):
+        self.policy = policy
+        self.blocked_domains = blocked_domains
+        self.allowed_domains = allowed_domains
+        self.blocked = Counter()
+        self.allowed = 0
+        self.approx_bytes_loaded = 0
+    
+    async def attach(self, context):
+        await context.route('**/*', self._handle)
+        context.on('response', self._on_response)
+    
+    def classify(self, request):
+        """返回拦截原因，放行时返回 None"""
+        host = urlsplit(request.url).hostname or ''
+        if _host_matches(host, self.allowed_domains):
+            return None
+        if _host_matches(host, self.blocked_domains):
+            return 'tracking'
+        # 子资源按其所在 frame 的页面类型判断
+        page_url = request.url if request.is_navigation_request() else request.frame.url
+        if request.resource_type in self.policy.get(page_type(page_url), ()):
+            return request.resource_type
+        return None
+    
+    async def _handle(self, route):
+        try:
+            reason = self.classify(route.request)
+        except Exception:
+            reason = None
+        if reason:
+            self.blocked[reason] += 1
+            await route.abort('blockedbyclient')
+        else:
+            self.allowed += 1
+            await route.continue_()
+    
+    def _on_response(self, response):
+        try:
+            self.approx_bytes_loaded += int(response.headers.get('content-length') or 0)
+        except ValueError:
+            pass
+    
+    def summary(self):
+        return {'blocked': dict(self.blocked), 'blocked_total': sum(self.blocked.values()),
+                'allowed': self.allowed, 'approx_bytes_loaded': self.approx_bytes_loaded}
+
+# ==================== 账号清单 ====================
+# 账号文件中除 email / password 外可以逐个账号覆盖的字段
+ACCOUNT_OVERRIDES = {
+    'enabled': bool,        # false 时跳过该账号
+    'tabs': int,            # 覆盖 XSERVER_TABS
+    'stage_retries': str,   # 覆盖 XSERVER_STAGE_RETRIES，如 "ocr=3,turnstile=2"
+    'proxy': str,           # 浏览器上下文和 HTTP 快速检查使用的代理，如 http://host:port
+}
+
+def _account_from_row(row, defaults=None):
+    """把文件中的一行 (dict) 规范成账号，缺少邮箱或密码时抛出 ValueError"""
+    if not isinstance(row, dict):
+        raise ValueError("不是键值对象")
+    row = {**(defaults or {}), **{k: v for k, v in row.items() if v not in (None, '')}}
+    email = str(row.get('email', '')).strip()
+    password = row.get('password')
+    if not password and row.get('password_env'):
+        # 密码可以放在环境变量中，文件里只写变量名
+        password = os.environ.get(row['password_env'])
+    if not email or not password:
+        raise ValueError("缺少 email 或 password")
+    account = {'email': email, 'password': str(password)}
+    for key, cast in ACCOUNT_OVERRIDES.items():
+        if key in row:
+            value = row[key]
+            if cast is bool and isinstance(value, str):
+                value = value.strip().lower() not in ('0', 'false', 'no', 'off')
+            account[key] = cast(value)
+    return account
+
+def _iter_rows(path):
+    """逐行读取账号文件，产生 (行号, dict, defaults)；CSV / JSONL 不会一次读入整个文件"""
+    suffix = path.suffix.lower()
+    if suffix == '.toml':
+        if tomllib is None:
+            raise RuntimeError("TOML 账号文件需要 Python 3.11+，请改用 CSV 或 JSONL")
+        with open(path, 'rb') as f:
+            data = tomllib.load(f)
+        defaults = data.get('defaults', {})
+        for i, row in enumerate(data.get('accounts', []), 1):
+            yield i, row, defaults
+    elif suffix == '.csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = csv.DictReader(line for line in f if not line.lstrip().startswith('#'))
+            for i, row in enumerate(rows, 1):
+                yield i, row, None
+    elif suffix in ('.jsonl', '.ndjson'):
+        with open(path, encoding='utf-8') as f:
+            for i, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    Logger.log("账号", f"{path} 第 {i} 行不是有效的 JSON，已忽略: {e}", "WARN")
+                    continue
+                yield i, row, None
+    else:
+        raise RuntimeError(f"不支持的账号文件格式: {path.suffix} (支持 .toml / .csv / .jsonl)")
+
+def shard_of(email, count):
+    """按邮箱的稳定哈希分片，同一账号在任何机器上都落在同一分片"""
+    digest = hashlib.sha1(email.strip().lower().encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+def parse_shard(s):
+    """解析 "i/n" (0 <= i < n)，未设置时返回 None"""
+    if not s:
+        return None
+    try:
+        index, count = (int(x) for x in s.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分片格式应为 i/n: {s}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"分片需要满足 0 <= i < n: {s}")
+    return index, count
+
+def iter_accounts(path=None, shard=None):
+    """逐个产生账号: 配置了账号文件时从文件读取，否则解析 XSERVER_ACCOUNT
+    
+    重复的邮箱只保留第一次出现的；enabled 为 false 的账号和不属于本分片的账号被跳过。
+    """
+    if path:
+        def rows():
+            for where, row, defaults in _iter_rows(Path(path)):
+                try:
+                    yield _account_from_row(row, defaults)
+                except (ValueError, TypeError) as e:
+                    Logger.log("账号", f"{path} 第 {where} 条无效，已忽略: {e}", "WARN")
+        accounts = rows()
+    else:
+        accounts = iter(parse_accounts(ACCOUNTS_STR))
+    seen = set()
+    for acc in accounts:
+        key = acc['email'].lower()
+        if key in seen:
+            Logger.log("账号", f"{acc['email']} 重复，已忽略", "WARN")
+            continue
+        seen.add(key)
+        if not acc.get('enabled', True):
+            continue
+        if shard and shard_of(acc['email'], shard[1]) != shard[0]:
+            continue
+        yield acc
+
+# ==================== 状态存储 ====================
+class StateStore:
+    """本地 SQLite 状态库，记录每个账号最近一次已知的到期时间、检查结果和下次检查时间"""
+    # 旧版本数据库缺少的列，打开时自动补上
+    MIGRATIONS = {
+        'next_check': "ALTER TABLE accounts ADD COLUMN next_check TEXT",
+        'failures': "ALTER TABLE accounts ADD COLUMN failures INTEGER NOT NULL DEFAULT 0",
+    }
+    
+    def __init__(self, path=None, margin_days=None, recheck_hours=None, jitter_minutes=None, retry_minutes=None,
+                 retry_max_hours=None, settings=None):
+        s = settings or current_settings()
+        path = s.state_db if path is None else path
+        margin_days = s.skip_margin_days if margin_days is None else margin_days
+        recheck_hours = s.recheck_hours if recheck_hours is None else recheck_hours
+        jitter_minutes = s.schedule_jitter_minutes if jitter_minutes is None else jitter_minutes
+        retry_minutes = s.retry_minutes if retry_minutes is None else retry_minutes
+        retry_max_hours = s.retry_max_hours if retry_max_hours is None else retry_max_hours
+        self._args = (path, margin_days, recheck_hours, jitter_minutes, retry_minutes, retry_max_hours)
+        self._executor = None
+        self._writer = None
+        self.margin_days = margin_days
+        self.recheck_hours = recheck_hours
+        self.jitter = timedelta(minutes=jitter_minutes)
+        self.retry = timedelta(minutes=retry_minutes)
+        self.retry_max = timedelta(hours=retry_max_hours)
+        # --processes 时多个进程写同一个库，等锁时间放宽到 30 秒
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS accounts (
+                email TEXT PRIMARY KEY,
+                expire TEXT,
+                checked_at TEXT,
+                success INTEGER,
+                msg TEXT
+            )""")
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(accounts)")}
+        for column, ddl in self.MIGRATIONS.items():
+            if column not in columns:
+                self.conn.execute(ddl)
+        self.conn.commit()
+    
+    def get(self, email):
+        row = self.conn.execute("SELECT * FROM accounts WHERE email = ?", (email,)).fetchone()
+        if not row:
+            return None
+        state = dict(row)
+        state['expire'] = date.fromisoformat(state['expire']) if state['expire'] else None
+        state['checked_at'] = datetime.fromisoformat(state['checked_at']) if state['checked_at'] else None
+        state['next_check'] = datetime.fromisoformat(state['next_check']) if state['next_check'] else None
+        return state
+    
+    def record(self, result):
+        """保存一次检查结果，未解析到到期时间时保留旧值"""
+        expire = result.get('new_expire') or result.get('old_expire')
+        self.conn.execute("""
+            INSERT INTO accounts (email, expire, checked_at, success, msg) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(email) DO UPDATE SET
+                expire = COALESCE(excluded.expire, accounts.expire),
+                checked_at = excluded.checked_at,
+                success = excluded.success,
+                msg = excluded.msg
+        """, (result['email'], expire.isoformat() if expire else None, datetime.now().isoformat(timespec='seconds'),
+              int(bool(result.get('success'))), result.get('msg', '')))
+        self.conn.commit()
+    
+    def record_account(self, email, results):
+        """把同一账号各台 VPS 的结果合并为一条记录: 到期时间取最早的一台，全部成功才算成功
+        
+        同时按结果安排下次检查时间，任何一台失败都按失败退避。
+        """
+        expires = [r.get('new_expire') or r.get('old_expire') for r in results]
+        expires = [e for e in expires if e]
+        self.record({'email': email, 'success': bool(results) and all(r.get('success') for r in results),
+                     'old_expire': min(expires) if expires else None,
+                     'msg': '; '.join(dict.fromkeys(r.get('msg', '') for r in results))})
+        failed = not results or any(result_outcome(r) == 'failed' for r in results)
+        self.schedule(email, failed)
+    
+    def _save_account(self, email, results):
+        if self._writer is None:
+            self._writer = StateStore(*self._args)
+        self._writer.record_account(email, results)
+    
+    async def save_account(self, email, results):
+        """在事件循环中使用的 record_account: 在专用线程中用独立连接写入，写入失败只记录警告
+        
+        等锁最长 30 秒，不能阻塞其他账号；写入失败也不能让已经续期成功的账号变成错误。
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state")
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._save_account, email, results)
+        except sqlite3.Error as e:
+            Logger.log("状态", f"{email}: 保存检查结果失败: {e}", "WARN")
+    
+    def next_check_time(self, expire, failures, now=None):
+        """计算下次检查时间
+        
+        失败后按 retry * 2^(n-1) 退避 (不超过 retry_max)；否则在续期窗口打开时检查，
+        窗口已打开但还没有续期链接时隔 retry 再看；最迟 recheck_hours 后复查一次。
+        成功和到期驱动的时间加上 [0, jitter) 的随机偏移，避免所有账号同时开始。
+        """
+        now = now or datetime.now()
+        if failures:
+            return now + min(self.retry * 2 ** (failures - 1), self.retry_max)
+        if not expire:
+            return now + self.retry
+        window = datetime.combine(expire - timedelta(days=RENEW_WINDOW_DAYS), datetime.min.time())
+        if window > now:
+            at = window
+        elif expire >= now.date():
+            at = now + self.retry
+        else:
+            # 已经过期，没有必要频繁重试
+            at = now + timedelta(hours=self.recheck_hours)
+        at = min(at, now + timedelta(hours=self.recheck_hours))
+        return at + self.jitter * random.random()
+    
+    def schedule(self, email, failed, now=None):
+        state = self.get(email)
+        failures = (state['failures'] + 1) if failed and state else int(failed)
+        next_check = self.next_check_time(state['expire'] if state else None, failures, now)
+        self.conn.execute("""
+            INSERT INTO accounts (email, next_check, failures) VALUES (?, ?, ?)
+            ON CONFLICT(email) DO UPDATE SET next_check = excluded.next_check, failures = excluded.failures
+        """, (email, next_check.isoformat(timespec='seconds'), failures))
+        self.conn.commit()
+        return next_check
+    
+    def due(self, emails, now=None):
+        """返回 (到期需要检查的账号, 其余账号中最早的下次检查时间)"""
+        now = now or datetime.now()
+        due, upcoming = [], []
+        for email in emails:
+            state = self.get(email)
+            if not state or not state['next_check'] or state['next_check'] <= now:
+                due.append(email)
+            else:
+                upcoming.append(state['next_check'])
+        return due, min(upcoming) if upcoming else None
+    
+    def by_urgency(self, emails):
+        """按最近已知的到期日从早到晚排序，没有记录的账号排在最前"""
+        def key(email):
+            state = self.get(email)
+            return state['expire'] if state and state['expire'] else date.min
+        return sorted(emails, key=key)
+    
+    def skip_reason(self, email, now=None):
+        """账号无需处理时返回原因，需要处理时返回 None"""
+        state = self.get(email)
+        if not state or not state['expire'] or not state['checked_at']:
+            return None
+        now = now or datetime.now()
+        days_left = (state['expire'] - now.date()).days
+        if days_left <= RENEW_WINDOW_DAYS + self.margin_days:
+            return None
+        if now - state['checked_at'] >= timedelta(hours=self.recheck_hours):
+            return None
+        return f"到期 {state['expire']} (剩余 {days_left} 天)，未到续期时间"
+    
+    def close(self):
+        if self._executor is not None:
+            if self._writer is not None:
+                self._executor.submit(self._writer.close).result()
+            self._executor.shutdown()
+            self._executor = self._writer = None
+        self.conn.close()
+
+# ==================== 账号租约 ====================
+class LeaseStore:
+    """基于 SQLite 的账号租约，保证同一时间只有一个进程处理同一个账号
+    
+    与状态库共用 state.db (也可以指向多台机器共享的路径)。取得租约用 BEGIN IMMEDIATE
+    串行化；持有期间后台每 ttl/3 秒续约一次，进程崩溃后租约在 ttl 秒后过期，
+    账号可被其他进程重新取得。
+    其他进程持有写锁时 BEGIN IMMEDIATE 最多等待 30 秒，因此数据库操作都在专用线程中
+    用独立的连接执行，不阻塞事件循环。
+    """
+    def __init__(self, path=None, ttl=None, owner=None, settings=None):
+        s = settings or current_settings()
+        path = s.state_db if path is None else path
+        self.ttl = s.lease_ttl if ttl is None else ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.held = set()
+        # 连接只在这个单线程执行器中使用，操作天然串行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lease")
+        self.conn = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                email TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                acquired_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )""")
+        self._heartbeat = None
+    
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+    
+    def _acquire(self, email):
+        """返回 (是否取得, 被接管的过期租约持有者)"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT owner, expires_at FROM leases WHERE email = ?", (email,)).fetchone()
+            if row and row['owner'] != self.owner and row['expires_at'] > now:
+                self.conn.execute("ROLLBACK")
+                return False, None
+            self.conn.execute("""
+                INSERT INTO leases (email, owner, acquired_at, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(email) DO UPDATE SET owner = excluded.owner, acquired_at = excluded.acquired_at,
+                    expires_at = excluded.expires_at
+            """, (email, self.owner, now, now + self.ttl))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return True, row['owner'] if row and row['owner'] != self.owner else None
+    
+    async def acquire(self, email):
+        """取得账号的租约，已被其他进程持有且未过期时返回 False"""
+        ok, expired_owner = await self._call(self._acquire, email)
+        if not ok:
+            return False
+        if expired_owner:
+            Logger.log("租约", f"{email}: {expired_owner} 的租约已过期，接管", "WARN")
+        self.held.add(email)
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._renew_loop())
+        return True
+    
+    def _holder(self, email):
+        row = self.conn.execute("SELECT owner FROM leases WHERE email = ?", (email,)).fetchone()
+        return row['owner'] if row else None
+    
+    async def holder(self, email):
+        return await self._call(self._holder, email)
+    
+    def _release(self, email):
+        self.conn.execute("DELETE FROM leases WHERE email = ? AND owner = ?", (email, self.owner))
+    
+    async def release(self, email):
+        self.held.discard(email)
+        await self._call(self._release, email)
+    
+    def _renew(self, emails):
+        lost = []
+        expires_at = time.time() + self.ttl
+        for email in emails:
+            cur = self.conn.execute("UPDATE leases SET expires_at = ? WHERE email = ? AND owner = ?",
+                                    (expires_at, email, self.owner))
+            if cur.rowcount == 0:
+                lost.append(email)
+        return lost
+    
+    async def renew(self):
+        """延长本进程持有的所有租约，返回已被他人接管的账号"""
+        lost = await self._call(self._renew, list(self.held))
+        self.held.difference_update(lost)
+        return lost
+    
+    async def _renew_loop(self):
+        while self.held:
+            await asyncio.sleep(max(1.0, self.ttl / 3))
+            try:
+                for email in await self.renew():
+                    Logger.log("租约", f"{email}: 租约已被其他进程接管", "WARN")
+            except sqlite3.Error as e:
+                Logger.log("租约", f"续约失败: {e}", "WARN")
+    
+    def entries(self):
+        """所有租约 (含已过期未清理的)，用于 --leases 查看"""
+        now = time.time()
+        return [{'email': row['email'], 'owner': row['owner'],
+                 'acquired_at': datetime.fromtimestamp(row['acquired_at']).isoformat(timespec='seconds'),
+                 'expires_at': datetime.fromtimestamp(row['expires_at']).isoformat(timespec='seconds'),
+                 'expired': row['expires_at'] <= now}
+                for row in self.conn.execute("SELECT * FROM leases ORDER BY acquired_at")]
+    
+    async def close(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        for email in list(self.held):
+            await self.release(email)
+        await self._call(self.conn.close)
+        self._executor.shutdown()
+
+# ==================== 导航缓存 ====================
+def same_page(url, href):
+    """url 是否就是 href 指向的页面 (比较路径和查询参数)，用于识别被重定向到别处的情况"""
+    a, b = urlsplit(url), urlsplit(urljoin(url, href))
+    return (a.path.rstrip('/'), a.query) == (b.path.rstrip('/'), b.query)
+
+class NavigationCache:
+    """每个账号的 VPS 详情页路径，保存在 state.db
+    
+    详情页地址基本不变，命中时直接访问详情页，省去 VPS 列表页 (续期链接总是从详情页读取，不缓存)；
+    缓存的详情页返回 4xx、被重定向或读不到到期时间时由调用方 invalidate()，改为读取列表页。
+    超过 max_age_hours 的缓存也重新读取列表页，以发现新增的 VPS。
+    同一账号在一次运行中可能被查询多次 (HTTP 快速检查和浏览器流程)，命中/未命中只按第一次计数。
+    """
+    def __init__(self, path=None, max_age_hours=None, settings=None):
+        s = settings or current_settings()
+        path = s.state_db if path is None else path
+        self.max_age = (s.nav_cache_hours if max_age_hours is None else max_age_hours) * 3600
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._counted = set()
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS navigation (
+                email TEXT PRIMARY KEY,
+                paths TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self.conn.commit()
+    
+    def _load(self, email):
+        row = self.conn.execute("SELECT paths, updated_at FROM navigation WHERE email = ?", (email,)).fetchone()
+        if not row:
+            return [], 0
+        # 旧版本保存的是 {'detail', 'extend'} 列表
+        return [p['detail'] if isinstance(p, dict) else p for p in json.loads(row[0])], row[1]
+    
+    def get(self, email):
+        """返回缓存的详情页路径列表，没有缓存或已过期时返回 None"""
+        paths, updated_at = self._load(email)
+        hit = bool(paths) and time.time() - updated_at <= self.max_age
+        if email not in self._counted:
+            self._counted.add(email)
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return paths if hit else None
+    
+    def put(self, email, details):
+        """保存从列表页读到的详情页路径并重新开始计算有效期
+        
+        只应在读取列表页之后调用，缓存命中时调用会让缓存永不过期。
+        """
+        if not details:
+            return
+        self.conn.execute("""
+            INSERT INTO navigation (email, paths, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(email) DO UPDATE SET paths = excluded.paths, updated_at = excluded.updated_at
+        """, (email, json.dumps(list(details)), time.time()))
+        self.conn.commit()
+    
+    def invalidate(self, email):
+        self.stale += 1
+        self.conn.execute("DELETE FROM navigation WHERE email = ?", (email,))
+        self.conn.commit()
+    
+    def log_summary(self):
+        if self.hits or self.misses:
+            Logger.log("导航", f"详情页缓存命中 {self.hits} 次，未命中 {self.misses} 次，失效 {self.stale} 次", "INFO")
+        # 常驻调度模式下每批结束时调用，下一批重新计数
+        self._counted.clear()
+    
+    def close(self):
+        self.conn.close()
+
+# ==================== 会话存储 ====================
+class SessionStore:
+    """基于 Playwright storage state (cookies + localStorage) 的会话存储
+    
+    每个账号一个 sessions/{email}.json；内存中缓存已读取的状态，
+    同一账号的读写通过锁串行化，写入时先写临时文件再原子替换。
+    旧版本只保存了 cookie 列表，读取时自动转换。
+    """
+    def __init__(self, directory=None, settings=None):
+        self.directory = Path((settings or current_settings()).session_dir if directory is None else directory)
+        self._cache = {}
+        self._locks = {}
+    
+    def path(self, email):
+        return self.directory / f"{email}.json"
+    
+    def lock(self, email):
+        return self._locks.setdefault(email, asyncio.Lock())
+    
+    def load(self, email):
+        """返回账号的 storage state，没有保存的会话时返回 None"""
+        if email in self._cache:
+            return self._cache[email]
+        try:
+            with open(self.path(email), encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if isinstance(state, list):
+            state = {'cookies': state, 'origins': []}
+        self._cache[email] = state
+        return state
+    
+    def cookies(self, email):
+        state = self.load(email)
+        return state.get('cookies', []) if state else []
+    
+    async def save(self, email, state):
+        async with self.lock(email):
+            self._cache[email] = state
+            await asyncio.to_thread(self._write, self.path(email), state)
+    
+    @staticmethod
+    def _write(path, state):
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+# ==================== HTTP 快速检查 ====================
+DETAIL_HREF_RE = re.compile(r'href=["\']([^"\']*server/detail[^"\']*)["\']')
+EXTEND_HREF_RE = re.compile(r'href=["\']([^"\']*extend[^"\']*)["\']')
+
+def html_to_text(page_html):
+    """粗略地把 HTML 转成按块换行的文本，供到期时间正则使用"""
+    text = re.sub(r'(?is)<(script|style)\b.*?</\1>', ' ', page_html)
+    text = re.sub(r'(?i)<(br|/?(tr|td|th|dt|dd|p|div|li))\b[^>]*>', '\n', text)
+    text = re.sub(r'<[^>]+>', ' ', text)
+    return html.unescape(text)
+
+def cookie_header(cookies, url):
+    """按域名、路径和过期时间挑选适用于 url 的 cookie，拼成 Cookie 请求头"""
+    parts = urlsplit(url)
+    host, path = parts.hostname or '', parts.path or '/'
+    now = time.time()
+    pairs = []
+    for c in cookies:
+        domain = (c.get('domain') or '').lstrip('.')
+        if domain and host != domain and not host.endswith('.' + domain):
+            continue
+        if not path.startswith(c.get('path') or '/'):
+            continue
+        expires = c.get('expires', -1)
+        if expires not in (None, -1) and expires < now:
+            continue
+        pairs.append(f"{c['name']}={c['value']}")
+    return '; '.join(pairs)
+
+def vps_label(href):
+    """从详情链接中取 VPS 编号作为结果标识，取不到时使用链接本身"""
+    query = parse_qs(urlsplit(href).query)
+    for key in ('id', 'id_vps'):
+        if query.get(key):
+            return query[key][0]
+    return href
+
+async def check_account_http(http, sessions, email, proxy=None, nav=None, settings=None):
+    """不启动浏览器，用已保存的会话通过 HTTP 读取 VPS 列表和所有详情页
+    
+    返回的 session 为 valid / expired / missing；只有 session 为 valid
+    时 vps (每台的 detail/expire/extend) 才有意义，expire 为其中最早的到期时间。
+    给出 nav (NavigationCache) 时先直接读取缓存的详情页，失效时再读取列表页。
+    """
+    s = settings or current_settings()
+    info = {"email": email, "session": "missing", "vps": [], "expire": None, "error": None}
+    cookies = sessions.cookies(email)
+    if not cookies:
+        return info
+    
+    async def fetch(url, strict=True):
+        """返回 HTML，被重定向到登录页时返回 None；strict=False 时 4xx 或被重定向到别处返回空字符串"""
+        headers = {'Cookie': cookie_header(cookies, url), 'User-Agent': CONTEXT_OPTIONS['user_agent']}
+        status, body, final_url = await http.get_page(url, headers=headers, timeout=30, proxy=proxy)
+        if "login" in final_url:
+            return None
+        if not strict and (status >= 400 or not same_page(final_url, url)):
+            return ''
+        if status >= 400:
+            raise RuntimeError(f"HTTP {status}: {url}")
+        return body
+    
+    async def read_details(details, strict=True):
+        """读取所有详情页，会话失效返回 None，有详情页失效 (非 strict) 返回 False"""
+        pages = await asyncio.gather(*(fetch(urljoin(s.base_url, href), strict) for href in details))
+        if any(p is None for p in pages):
+            return None
+        vps = []
+        for href, detail_html in zip(details, pages):
+            m = EXTEND_HREF_RE.search(detail_html)
+            vps.append({"vps": vps_label(href), "detail": href,
+                        "expire": parse_expire_text(html_to_text(detail_html)) if detail_html else None,
+                        "extend": html.unescape(m.group(1)) if m else None})
+        if not strict and not all(v["expire"] for v in vps):
+            return False
+        return vps
+    
+    try:
+        cached = nav.get(email) if nav else None
+        vps = await read_details(cached, strict=False) if cached else False
+        if vps is False:
+            if cached:
+                nav.invalidate(email)
+            index_html = await fetch(s.vps_index_url)
+            vps = None if index_html is None else await read_details(
+                list(dict.fromkeys(html.unescape(m) for m in DETAIL_HREF_RE.findall(index_html))))
+            # 只有读取了列表页才更新缓存 (和它的有效期)
+            if vps and nav:
+                nav.put(email, [v["detail"] for v in vps])
+        if vps is None:
+            info["session"] = "expired"
+            return info
+        info["session"] = "valid"
+        info["vps"] = vps
+        expires = [v["expire"] for v in info["vps"] if v["expire"]]
+        info["expire"] = min(expires) if expires else None
+    except Exception as e:
+        info["error"] = str(e)[:100]
+    return info
+
+async def check_accounts(http, sessions, accounts, workers=8, nav=None):
+    """并行检查所有账号的到期时间，结果按输入顺序返回"""
+    sem = asyncio.Semaphore(max(1, workers))
+    
+    async def check(acc):
+        async with sem:
+            return await check_account_http(http, sessions, acc['email'], proxy=acc.get('proxy'), nav=nav)
+    
+    return await asyncio.gather(*(check(acc) for acc in accounts))
+
+# ==================== 指标导出 ====================
+def result_outcome(result):
+    """把账号 (或单台 VPS) 的结果归类为 renewed / skipped / not_due / failed"""
+    if result.get('success'):
+        return 'renewed'
+    if result.get('skipped'):
+        return 'skipped'
+    if result.get('msg', '').startswith('未找到续期链接'):
+        return 'not_due'
+    return 'failed'
+
+def _prom_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsExporter:
+    """把每个账号的阶段耗时写成 JSON-lines，并为 node_exporter 生成 textfile"""
+    def __init__(self, jsonl_path=None, prom_path=None, settings=None):
+        s = settings or current_settings()
+        jsonl_path = s.metrics_path if jsonl_path is None else jsonl_path
+        prom_path = s.prom_file if prom_path is None else prom_path
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self.prom_path = Path(prom_path) if prom_path else None
+        self.run_id = uuid.uuid4().hex[:12]
+    
+    def record(self, result):
+        timing = result.get('timing') or {}
+        return {
+            'run_id': self.run_id,
+            'ts': timing.get('started_at') or datetime.now().isoformat(timespec='seconds'),
+            'email': result['email'],
+            'vps': result.get('vps'),
+            'outcome': result_outcome(result),
+            'msg': result.get('msg', ''),
+            'total_seconds': timing.get('total'),
+            'wait_seconds': round(sum(w['seconds'] for w in result.get('waits', [])), 3),
+            'stages': timing.get('stages', []),
+        }
+    
+    def export(self, results):
+        records = [self.record(r) for r in results]
+        if self.jsonl_path:
+            self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                for rec in records:
+                    f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+        if self.prom_path:
+            self.write_prom(records)
+        return records
+    
+    def write_prom(self, records):
+        lines = [
+            '# HELP xserver_renew_stage_duration_seconds Duration of each renewal stage in the last run.',
+            '# TYPE xserver_renew_stage_duration_seconds gauge',
+        ]
+        retries = ['# HELP xserver_renew_stage_retries Retries of each renewal stage in the last run.',
+                   '# TYPE xserver_renew_stage_retries gauge']
+        totals = ['# HELP xserver_renew_account_duration_seconds Total processing time per account (and VPS) in the last run.',
+                  '# TYPE xserver_renew_account_duration_seconds gauge']
+        outcomes = ['# HELP xserver_renew_account_outcome Outcome of each account (and VPS) in the last run (1 = current outcome).',
+                    '# TYPE xserver_renew_account_outcome gauge']
+        counts = Counter(rec['outcome'] for rec in records)
+        for rec in records:
+            account = f'email="{_prom_label(rec["email"])}",vps="{_prom_label(rec.get("vps") or "")}"'
+            # 重试会让同一阶段出现多次，同一阶段只输出一个序列: 耗时和重试次数累加，outcome 取最后一次
+            stages = {}
+            for st in rec['stages']:
+                agg = stages.setdefault(st['stage'], {'seconds': 0.0, 'retries': 0})
+                agg['seconds'] += st['seconds']
+                agg['retries'] += st['retries']
+                agg['outcome'] = st['outcome']
+            for stage, agg in stages.items():
+                labels = f'{account},stage="{_prom_label(stage)}",outcome="{agg["outcome"]}"'
+                lines.append(f'xserver_renew_stage_duration_seconds{{{labels}}} {round(agg["seconds"], 3)}')
+                retries.append(f'xserver_renew_stage_retries{{{labels}}} {agg["retries"]}')
+            if rec['total_seconds'] is not None:
+                totals.append(f'xserver_renew_account_duration_seconds{{{account}}} {rec["total_seconds"]}')
+            outcomes.append(f'xserver_renew_account_outcome{{{account},outcome="{rec["outcome"]}"}} 1')
+        summary = ['# HELP xserver_renew_accounts Accounts per outcome in the last run.',
+                   '# TYPE xserver_renew_accounts gauge']
+        summary += [f'xserver_renew_accounts{{outcome="{k}"}} {v}' for k, v in sorted(counts.items())]
+        summary += ['# HELP xserver_renew_last_run_timestamp_seconds Unix time the last run finished.',
+                    '# TYPE xserver_renew_last_run_timestamp_seconds gauge',
+                    f'xserver_renew_last_run_timestamp_seconds {time.time():.0f}']
+        text = '\n'.join(lines + retries + totals + outcomes + summary) + '\n'
+        # node_exporter 可能随时读取，先写临时文件再替换
+        self.prom_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.prom_path.with_name(f".{self.prom_path.name}.{os.getpid()}.tmp")
+        tmp.write_text(text, encoding='utf-8')
+        os.replace(tmp, self.prom_path)
+
+def stage_percentiles(records):
+    """按阶段汇总本次运行的耗时 p50 / p95 / 最大值"""
+    durations = {}
+    for rec in records:
+        for st in rec['stages']:
+            durations.setdefault(st['stage'], []).append(st['seconds'])
+    summary = {}
+    for stage, values in durations.items():
+        values.sort()
+        pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+        summary[stage] = {'count': len(values), 'p50': pick(0.5), 'p95': pick(0.95), 'max': values[-1]}
+    return summary
+
+# ==================== 浏览器管理 ====================
+def x_display_available(display=None):
+    """DISPLAY 指向的 X 服务器是否存在 (本地显示器检查 /tmp/.X11-unix 下的套接字)"""
+    display = display if display is not None else os.environ.get('DISPLAY', '')
+    if not display:
+        return False
+    host, _, number = display.rpartition(':')
+    if host and host != 'unix':
+        return True  # 远程或 TCP 显示器无法在本地检查，交给 Chromium
+    return Path(f"/tmp/.X11-unix/X{number.split('.')[0]}").exists()
+
+class BrowserManager:
+    """整个运行共享一个 Chromium 进程，每个账号分配独立的 BrowserContext
+    
+    浏览器在分配 recycle_after 个上下文后或崩溃后重新启动；
+    旧浏览器会等其上仍在使用的上下文全部归还后再关闭。
+    未传入 playwright 时在第一次需要浏览器时才启动 Playwright。
+    
+    设置了 cdp_url 时连接常驻浏览器 (--daemon)，不再按上下文数回收，
+    close() 只断开连接并关闭本次创建的上下文；连接失败时退回自行启动。
+    自行启动有界面的 Chromium 时如果没有可用的 X 显示器 (常驻服务停止后 Xvfb 也随之退出)，
+    自行启动 Xvfb 并在 close() 时关闭；Turnstile 需要有界面的浏览器，因此不会退回无头模式，
+    找不到 Xvfb 时直接报错。
+    
+    传入 browser (调用方已启动的 Playwright Browser) 时直接使用，不回收也不关闭它，
+    close() 只关闭本次创建的上下文；它断开后才自行启动 Chromium。
+    """
+    def __init__(self, playwright=None, recycle_after=None, cdp_url=None, browser=None, settings=None):
+        self.settings = settings or current_settings()
+        recycle_after = self.settings.browser_recycle if recycle_after is None else recycle_after
+        cdp_url = self.settings.cdp_url if cdp_url is None else cdp_url
+        self.playwright = playwright
+        self._own_playwright = playwright is None
+        self.cdp_url = '' if browser is not None else cdp_url
+        self.recycle_after = 0 if cdp_url or browser is not None else recycle_after
+        self.launches = 0
+        self._browser = browser
+        self._external = browser
+        self._served = 0
+        self._active = {browser: 0} if browser is not None else {}
+        self._owners = {}
+        self._lock = asyncio.Lock()
+        self._xvfb = None
+    
+    async def _start_xvfb(self):
+        """启动 Xvfb 并等待其套接字出现，返回显示器名；无法启动时抛出 RuntimeError"""
+        display = os.environ.get('DISPLAY') or self.settings.xvfb_display
+        if self._xvfb is not None and self._xvfb.returncode is None and x_display_available(display):
+            return display
+        if not shutil.which('Xvfb'):
+            raise RuntimeError(f"没有可用的 X 显示器 (DISPLAY={display}) 且未找到 Xvfb: "
+                               "请启动 xserver-renew-browser.service、安装 Xvfb 或设置 XSERVER_HEADLESS=1")
+        self._xvfb = await asyncio.create_subprocess_exec(
+            'Xvfb', display, '-screen', '0', '1280x900x24',
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        for _ in range(50):
+            if x_display_available(display) or self._xvfb.returncode is not None:
+                break
+            await asyncio.sleep(0.1)
+        if not x_display_available(display):
+            raise RuntimeError(f"Xvfb {display} 启动失败 (code {self._xvfb.returncode})")
+        Logger.log("浏览器", f"没有可用的 X 显示器，已自行启动 Xvfb ({display})", "WARN")
+        return display
+    
+    async def _launch(self):
+        if self.playwright is None:
+            from playwright.async_api import async_playwright
+            self.playwright = await async_playwright().start()
+        if self.cdp_url:
+            try:
+                browser = await self.playwright.chromium.connect_over_cdp(self.cdp_url, timeout=10000)
+            except Exception as e:
+                Logger.log("浏览器", f"无法连接常驻浏览器 {self.cdp_url} ({e})，改为自行启动", "WARN")
+                self.cdp_url = ''
+                self.recycle_after = self.settings.browser_recycle
+            else:
+                self._active[browser] = 0
+                Logger.log("浏览器", f"已连接常驻浏览器 {self.cdp_url}", "OK")
+                return browser
+        env = None
+        if not self.settings.headless and not x_display_available():
+            # Playwright 驱动启动时已复制了环境变量，显示器需要随 launch 传入
+            env = {**os.environ, 'DISPLAY': await self._start_xvfb()}
+        browser = await self.playwright.chromium.launch(headless=self.settings.headless, args=BROWSER_ARGS, env=env)
+        self.launches += 1
+        self._served = 0
+        self._active[browser] = 0
+        Logger.log("浏览器", f"已启动 Chromium (第{self.launches}次)", "OK")
+        return browser
+    
+    async def _acquire(self):
+        async with self._lock:
+            browser = self._browser
+            if browser is None or not browser.is_connected():
+                if browser is not None:
+                    Logger.log("浏览器", "Chromium 已断开，重新连接" if self.cdp_url else "Chromium 已断开，重新启动", "WARN")
+                    await self._retire(browser)
+                browser = self._browser = await self._launch()
+            elif self.recycle_after and self._served >= self.recycle_after:
+                Logger.log("浏览器", f"已分配 {self._served} 个上下文，回收 Chromium", "INFO")
+                await self._retire(browser)
+                browser = self._browser = await self._launch()
+            self._served += 1
+            self._active[browser] += 1
+            return browser
+    
+    async def _retire(self, browser):
+        """标记浏览器为待回收，没有活跃上下文时立即关闭"""
+        if self._browser is browser:
+            self._browser = None
+        if self._active.get(browser, 0) == 0:
+            self._active.pop(browser, None)
+            if browser is self._external:
+                return
+            try:
+                await browser.close()
+            except Exception:
+                pass
+    
+    async def recycle(self):
+        """让下一个上下文使用新的 Chromium，当前浏览器在其上下文归还后关闭
+        
+        连接常驻浏览器时由守护进程负责重启，这里不做处理。返回是否进行了回收。
+        """
+        async with self._lock:
+            if self.cdp_url or self._browser is None or self._browser is self._external:
+                return False
+            Logger.log("浏览器", "内存不足，回收 Chromium", "INFO")
+            await self._retire(self._browser)
+            return True
+    
+    async def new_context(self, **options):
+        """从当前浏览器分配一个隔离的上下文，浏览器已崩溃时重启后重试一次"""
+        for attempt in range(2):
+            browser = await self._acquire()
+            try:
+                context = await browser.new_context(**{**CONTEXT_OPTIONS, **options})
+            except Exception:
+                await self._release(browser)
+                if attempt or browser.is_connected():
+                    raise
+                continue
+            self._owners[context] = browser
+            return context
+    
+    async def release(self, context):
+        """关闭上下文并归还给所属浏览器"""
+        browser = self._owners.pop(context, None)
+        try:
+            await context.close()
+        except Exception:
+            pass
+        if browser is not None:
+            await self._release(browser)
+    
+    async def _release(self, browser):
+        async with self._lock:
+            self._active[browser] = self._active.get(browser, 1) - 1
+            if browser is not self._browser or not browser.is_connected():
+                await self._retire(browser)
+    
+    async def close(self):
+        async with self._lock:
+            browsers = list(self._active)
+            contexts = [c for c, b in self._owners.items() if b is self._external]
+            self._browser = None
+            self._active.clear()
+            self._owners.clear()
+        for target in contexts + [b for b in browsers if b is not self._external]:
+            try:
+                await target.close()
+            except Exception:
+                pass
+        if self._own_playwright and self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+        if self._xvfb is not None:
+            if self._xvfb.returncode is None:
+                self._xvfb.terminate()
+                await self._xvfb.wait()
+            self._xvfb = None
+
+# ==================== 常驻浏览器 ====================
+def process_tree_rss(root_pid):
+    """读取 /proc，返回 root_pid 及其所有子孙进程的 RSS 之和 (字节)"""
+    children = {}
+    rss = {}
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            ppid, pages = int(fields[1]), int(fields[21])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+        rss[int(entry)] = pages * page_size
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total
+
+class BrowserDaemon:
+    """--daemon: 常驻 Xvfb 和一个开启远程调试端口的 Chromium，供定时运行通过 CDP 连接
+    
+    定期检查进程是否存活、调试端口是否响应、进程树内存是否超过上限，
+    异常时重启。内存超限但仍有页面打开 (有运行正在使用) 时推迟重启，
+    超过上限两倍时立即重启。
+    """
+    def __init__(self, port=CDP_PORT, display=None, max_rss_mb=DAEMON_MAX_RSS_MB,
+                 check_seconds=DAEMON_CHECK_SECONDS, headless=None):
+        s = current_settings()
+        self.port = port
+        self.display = display or s.xvfb_display
+        self.max_rss = int(max_rss_mb * 1024 * 1024)
+        self.check_seconds = check_seconds
+        self.headless = s.headless if headless is None else headless
+        self.endpoint = f"http://127.0.0.1:{port}"
+        self.http = HttpClient(limit_per_host=2)
+        self.restarts = 0
+        self._xvfb = None
+        self._chrome = None
+        self._profile = None
+        self._executable = None
+    
+    async def _start_xvfb(self):
+        if self.headless or (self._xvfb and self._xvfb.returncode is None):
+            return
+        if not shutil.which('Xvfb'):
+            Logger.log("守护", "未找到 Xvfb，使用现有 DISPLAY", "WARN")
+            return
+        self._xvfb = await asyncio.create_subprocess_exec(
+            'Xvfb', self.display, '-screen', '0', '1280x900x24',
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        os.environ['DISPLAY'] = self.display
+        Logger.log("守护", f"Xvfb 已启动 ({self.display})", "OK")
+    
+    async def _start_chrome(self):
+        if self._executable is None:
+            from playwright.async_api import async_playwright
+            async with async_playwright() as p:
+                self._executable = p.chromium.executable_path
+        # 每次启动使用全新的配置目录，避免缓存随时间膨胀
+        self._profile = tempfile.mkdtemp(prefix="xserver-chrome-")
+        args = [self._executable, *BROWSER_ARGS, f'--remote-debugging-port={self.port}',
+                '--remote-debugging-address=127.0.0.1', f'--user-data-dir={self._profile}',
+                '--no-first-run', '--no-default-browser-check']
+        if self.headless:
+            args.append('--headless=new')
+        self._chrome = await asyncio.create_subprocess_exec(
+            *args, 'about:blank', stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        for _ in range(60):
+            if await self._version():
+                Logger.log("守护", f"Chromium 已启动 (pid {self._chrome.pid})，CDP: {self.endpoint}", "OK")
+                return
+            if self._chrome.returncode is not None:
+                break
+            await asyncio.sleep(0.5)
+        raise RuntimeError("Chromium 远程调试端口未就绪")
+    
+    async def _version(self):
+        try:
+            status, _ = await self.http.request('GET', f"{self.endpoint}/json/version", timeout=2, retries=0)
+            return status == 200
+        except Exception:
+            return False
+    
+    async def _open_pages(self):
+        """当前打开的非空白页面数，用于判断是否有运行正在使用浏览器"""
+        try:
+            _, targets = await self.http.request('GET', f"{self.endpoint}/json/list", timeout=2, retries=0,
+                                                 parse='json')
+        except Exception:
+            return 0
+        return sum(1 for t in targets if t.get('type') == 'page' and t.get('url') != 'about:blank')
+    
+    @staticmethod
+    async def _terminate(proc, timeout=10):
+        if proc is None or proc.returncode is not None:
+            return
+        proc.terminate()
+        try:
+            await asyncio.wait_for(proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+    
+    async def _stop_chrome(self):
+        await self._terminate(self._chrome)
+        self._chrome = None
+        if self._profile:
+            shutil.rmtree(self._profile, ignore_errors=True)
+            self._profile = None
+    
+    async def restart(self, reason):
+        self.restarts += 1
+        Logger.log("守护", f"{reason}，重启 Chromium (第{self.restarts}次)", "WARN")
+        await self._stop_chrome()
+        await self._start_xvfb()
+        await self._start_chrome()
+    
+    async def check(self):
+        """检查一次，需要时重启"""
+        if self._xvfb and self._xvfb.returncode is not None:
+            await self.restart(f"Xvfb 已退出 (code {self._xvfb.returncode})")
+            return
+        if self._chrome is None or self._chrome.returncode is not None:
+            await self.restart(f"Chromium 已退出 (code {self._chrome.returncode if self._chrome else None})")
+            return
+        if not await self._version():
+            await self.restart("CDP 端口无响应")
+            return
+        rss = await asyncio.to_thread(process_tree_rss, self._chrome.pid)
+        if self.max_rss and rss > self.max_rss:
+            pages = await self._open_pages()
+            if pages and rss < self.max_rss * 2:
+                Logger.log("守护", f"内存 {rss / 1024 / 1024:.0f} MB 超过上限，{pages} 个页面使用中，稍后重启", "INFO")
+                return
+            await self.restart(f"内存 {rss / 1024 / 1024:.0f} MB 超过上限 {self.max_rss / 1024 / 1024:.0f} MB")
+    
+    async def run(self):
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            await self._start_xvfb()
+            await self._start_chrome()
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), self.check_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                if stop.is_set():
+                    break
+                try:
+                    await self.check()
+                except Exception as e:
+                    Logger.log("守护", f"健康检查失败: {e}", "WARN")
+        finally:
+            Logger.log("守护", "正在退出", "INFO")
+            await self._stop_chrome()
+            await self._terminate(self._xvfb)
+            await self.http.close()
+
+# ==================== 资源控制 ====================
+class RunDeadline:
+    """整个运行共享的时间预算 (XSERVER_RUN_BUDGET / --budget)
+    
+    开始一个需要浏览器的账号前，剩余时间不足预计耗时 (estimate()) 时推迟该账号；
+    页面等待和 YesCaptcha 轮询不超过剩余时间。已开始的账号不会被取消: 预算用完后
+    在下一个阶段 (登录、详情页、续期页、验证码、Turnstile、提交) 开始前停下并推迟，
+    已经提交的续期仍回到详情页确认结果，保证在 systemd 超时前正常结束并汇总。
+    """
+    def __init__(self, seconds, account_min=None):
+        self.seconds = seconds
+        self.account_min = current_settings().account_min_seconds if account_min is None else account_min
+        self.end = time.monotonic() + seconds
+        self.deferred = 0
+        self.timed_out = 0
+        self.durations = []
+    
+    def remaining(self):
+        return max(0.0, self.end - time.monotonic())
+    
+    def record(self, seconds):
+        """记录一个完整处理完的浏览器账号的耗时"""
+        self.durations.append(seconds)
+    
+    def estimate(self):
+        """一个浏览器账号的预计耗时: 本次运行已完成账号的平均耗时，至少 account_min 秒"""
+        if not self.durations:
+            return self.account_min
+        return max(self.account_min, sum(self.durations) / len(self.durations))
+    
+    def can_start(self, cost=None):
+        return self.remaining() >= (self.account_min if cost is None else cost)
+    
+    def cap(self, seconds):
+        return min(seconds, self.remaining())
+
+def deadline_cap(seconds):
+    """把一个超时 (秒) 限制在当前运行预算的剩余时间内，没有预算时原样返回"""
+    deadline = _deadline.get()
+    return deadline.cap(seconds) if deadline else seconds
+
+class DeadlineReached(Exception):
+    """运行预算已用完，在 stage 阶段开始前停下"""
+    def __init__(self, stage):
+        super().__init__(f"运行时间预算用完，在 {stage} 阶段前停止，推迟到下次运行")
+        self.stage = stage
+        self.msg = str(self)
+
+def check_deadline(stage):
+    """运行预算已用完时抛出 DeadlineReached，在阶段边界调用"""
+    deadline = _deadline.get()
+    if deadline and deadline.remaining() <= 0:
+        deadline.timed_out += 1
+        raise DeadlineReached(stage)
+
+def mark_deferred(result, reason):
+    """把结果标记为因运行预算推迟 (汇总中列出，状态库中不按失败退避)"""
+    Logger.log("预算", reason.msg, "WARN")
+    result.update(success=False, skipped=True, deferred=True, msg=reason.msg)
+    return result
+
+class UrgencyGate:
+    """按优先级 (数值小的先) 放行的并发名额，代替按到达顺序放行的 Semaphore"""
+    def __init__(self, slots):
+        self.free = max(1, slots)
+        self._waiters = []
+        self._seq = 0
+    
+    @asynccontextmanager
+    async def slot(self, priority):
+        if self.free and not self._waiters:
+            self.free -= 1
+        else:
+            self._seq += 1
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, self._seq, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._wake()
+                else:
+                    self._waiters = [w for w in self._waiters if w[2] is not future]
+                    heapq.heapify(self._waiters)
+                raise
+        try:
+            yield
+        finally:
+            self._wake()
+    
+    def _wake(self):
+        """把名额交给优先级最高的等待者，没有等待者时归还"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.free += 1
+
+def mem_available():
+    """系统可用内存 (MemAvailable，字节)，读取失败时返回 None"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+class ResourceGovernor:
+    """按内存余量决定是否开始处理下一个账号
+    
+    监控本进程树 (Python、Playwright 驱动和它启动的 Chromium) 的 RSS 和系统可用内存，
+    超过 rss_limit 或可用内存低于 min_free 时新账号排队等待，并让浏览器管理器回收
+    当前 Chromium (已有上下文归还后关闭)。没有正在处理的账号时总是放行，避免卡死。
+    有账号在处理时后台采样，summary() 返回峰值内存和限流情况。
+    """
+    def __init__(self, browsers=None, rss_limit_mb=None, min_free_mb=None, interval=1.0):
+        s = current_settings()
+        self.browsers = browsers
+        self.rss_limit = int((s.mem_limit_mb if rss_limit_mb is None else rss_limit_mb) * 1024 * 1024)
+        self.min_free = int((s.min_free_mb if min_free_mb is None else min_free_mb) * 1024 * 1024)
+        self.interval = interval
+        self.active = 0
+        self.peak_rss = 0
+        self.min_available = None
+        self.throttled = 0
+        self.throttle_seconds = 0.0
+        self.recycles = 0
+        self._recycled = False
+        self._sampler = None
+    
+    def sample(self):
+        rss = process_tree_rss(os.getpid())
+        available = mem_available()
+        self.peak_rss = max(self.peak_rss, rss)
+        if available is not None:
+            self.min_available = available if self.min_available is None else min(self.min_available, available)
+        return rss, available
+    
+    def pressure(self, rss, available):
+        """内存不足时返回原因，否则返回 None"""
+        if self.rss_limit and rss > self.rss_limit:
+            return f"进程内存 {rss / 1024 / 1024:.0f} MB 超过上限 {self.rss_limit / 1024 / 1024:.0f} MB"
+        if self.min_free and available is not None and available < self.min_free:
+            return f"系统可用内存 {available / 1024 / 1024:.0f} MB 低于 {self.min_free / 1024 / 1024:.0f} MB"
+        return None
+    
+    @asynccontextmanager
+    async def admit(self, name):
+        """等到有内存余量后放行一个账号，退出时归还名额"""
+        if self._sampler is None or self._sampler.done():
+            self._sampler = asyncio.create_task(self._sample_loop())
+        throttled_at = None
+        while True:
+            reason = self.pressure(*await asyncio.to_thread(self.sample))
+            if not reason:
+                self._recycled = False
+                break
+            if self.active == 0:
+                break
+            if throttled_at is None:
+                throttled_at = time.monotonic()
+                self.throttled += 1
+                Logger.log("资源", f"{reason}，{name} 等待 ({self.active} 个账号处理中)", "WARN")
+                # 同一段内存紧张期间只回收一次，避免刚启动的浏览器又被回收
+                if not self._recycled and self.browsers is not None and await self.browsers.recycle():
+                    self._recycled = True
+                    self.recycles += 1
+            await asyncio.sleep(self.interval)
+        if throttled_at is not None:
+            self.throttle_seconds += time.monotonic() - throttled_at
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            if self.active == 0:
+                await self.close()
+    
+    async def _sample_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self.sample)
+    
+    def summary(self):
+        return {
+            'peak_rss_mb': round(self.peak_rss / 1024 / 1024, 1),
+            'min_available_mb': round(self.min_available / 1024 / 1024, 1) if self.min_available is not None else None,
+            'throttled': self.throttled,
+            'throttle_seconds': round(self.throttle_seconds, 1),
+            'recycles': self.recycles,
+        }
+    
+    @staticmethod
+    def merge(summaries):
+        """合并多个工作进程的 summary()；内存峰值取各进程峰值之和 (总占用的上限)"""
+        available = [st['min_available_mb'] for st in summaries if st['min_available_mb'] is not None]
+        return {
+            'peak_rss_mb': round(sum(st['peak_rss_mb'] for st in summaries), 1),
+            'min_available_mb': min(available) if available else None,
+            'throttled': sum(st['throttled'] for st in summaries),
+            'throttle_seconds': round(sum(st['throttle_seconds'] for st in summaries), 1),
+            'recycles': sum(st['recycles'] for st in summaries),
+        }
+    
+    def log_summary(self):
+        self.log_stats(self.summary())
+    
+    @staticmethod
+    def log_stats(st):
+        available = f"，系统可用内存最低 {st['min_available_mb']:.0f} MB" if st['min_available_mb'] is not None else ""
+        Logger.log("资源", f"进程内存峰值 {st['peak_rss_mb']:.0f} MB{available}，限流 {st['throttled']} 次"
+                          f" (共 {st['throttle_seconds']:.1f}s)，回收浏览器 {st['recycles']} 次", "INFO")
+    
+    async def close(self):
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+
+class Runtime:
+    """一次运行中各账号共享的资源
+
+    settings 为本次运行的配置 (默认为当前配置)，处理账号时也作为深层函数的当前配置；
+    未传入的 sessions / artifacts / tracer 按它创建。
+    """
+    def __init__(self, browsers, http, state=None, sessions=None, artifacts=None, notifier=None, leases=None,
+                 governor=None, tracer=None, deadline=None, nav=None, settings=None):
+        self.settings = settings = settings or current_settings()
+        self.browsers = browsers
+        self.deadline = deadline
+        self.nav = nav
+        self.http = http
+        self.state = state
+        self.leases = leases
+        self.governor = governor
+        self.sessions = sessions or SessionStore(settings=settings)
+        self.artifacts = artifacts or ArtifactWriter(settings=settings)
+        self.tracer = tracer or TraceRecorder(self.artifacts, settings=settings)
+        self.notifier = notifier
+
+# ==================== 性能分析 ====================
+class Profiler:
+    """--profile: 整个运行的 cProfile 统计、各类 asyncio 任务的耗时和事件循环阻塞情况
+    
+    统计结果写入 <path> (pstats 格式，可用 snakeviz 等工具查看) 和 <path>.txt，
+    并在日志中输出最耗时的任务类型和事件循环的最大延迟。
+    """
+    def __init__(self, path, lag_interval=0.05):
+        self.path = Path(path)
+        self.lag_interval = lag_interval
+        self.tasks = {}
+        self.lags = []
+        self._profile = cProfile.Profile()
+    
+    def _task_factory(self, loop, coro, **kwargs):
+        task = asyncio.Task(coro, loop=loop, **kwargs)
+        name = getattr(coro, '__qualname__', type(coro).__name__)
+        start = time.monotonic()
+        
+        def done(_):
+            st = self.tasks.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            seconds = time.monotonic() - start
+            st['count'] += 1
+            st['total'] += seconds
+            st['max'] = max(st['max'], seconds)
+        task.add_done_callback(done)
+        return task
+    
+    async def _sample_lag(self):
+        """定时 sleep，实际醒来时间超出的部分即事件循环被阻塞的时间"""
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.lag_interval)
+            self.lags.append(time.monotonic() - start - self.lag_interval)
+    
+    async def run(self, coro):
+        loop = asyncio.get_running_loop()
+        loop.set_task_factory(self._task_factory)
+        sampler = asyncio.create_task(self._sample_lag())
+        self._profile.enable()
+        try:
+            return await coro
+        finally:
+            self._profile.disable()
+            sampler.cancel()
+            loop.set_task_factory(None)
+            self.report()
+    
+    def report(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._profile.dump_stats(self.path)
+        tasks = sorted(self.tasks.items(), key=lambda kv: kv[1]['total'], reverse=True)
+        lags = sorted(self.lags)
+        with open(f"{self.path}.txt", 'w', encoding='utf-8') as f:
+            pstats.Stats(self._profile, stream=f).sort_stats('cumulative').print_stats(40)
+            f.write("\nasyncio 任务 (按总耗时):\n")
+            for name, st in tasks:
+                f.write(f"{st['count']:6d} {st['total']:10.2f}s {st['max']:8.2f}s  {name}\n")
+        for name, st in tasks[:10]:
+            Logger.log("分析", f"{name}: {st['count']} 个任务，共 {st['total']:.1f}s，最长 {st['max']:.1f}s", "INFO")
+        if lags:
+            Logger.log("分析", f"事件循环延迟 p95 {lags[int(0.95 * (len(lags) - 1))] * 1000:.0f} ms，"
+                              f"最大 {lags[-1] * 1000:.0f} ms", "INFO")
+        Logger.log("分析", f"已写入 {self.path} 和 {self.path}.txt", "OK")
+
+# ==================== 主逻辑 ====================
+class StageFailed(Exception):
+    """续期流程中可重试的失败，stage 为失败的阶段，debug 为需要保存的调试快照名"""
+    def __init__(self, stage, msg, debug=None):
+        super().__init__(msg)
+        self.stage = stage
+        self.msg = msg
+        self.debug = debug
+
+class RetryBudget:
+    """单台 VPS 各阶段独立的重试次数预算，每次重试前按 backoff * 2^(n-1) 秒退避"""
+    def __init__(self, budgets=None, backoff=None):
+        s = current_settings()
+        self.budgets = parse_stage_retries(s.stage_retries) if budgets is None else dict(budgets)
+        self.backoff = s.retry_backoff if backoff is None else backoff
+        self.used = Counter()
+    
+    async def consume(self, stage):
+        """还有预算时记一次重试并退避，返回 True；预算用完返回 False"""
+        if self.used[stage] >= self.budgets.get(stage, 0):
+            return False
+        self.used[stage] += 1
+        note_retry()
+        await asyncio.sleep(self.backoff * 2 ** (self.used[stage] - 1))
+        return True
+
+def parse_stage_retries(s):
+    """解析 "ocr=3,turnstile=2" 格式的重试预算，覆盖默认值"""
+    budgets = dict(DEFAULT_STAGE_RETRIES)
+    for item in (s or '').split(','):
+        name, _, value = item.partition('=')
+        if name.strip() and value.strip().isdigit():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+async def login(rt, page, ready, email, password):
+    """在 page 中登录账号并保存会话，成功返回 True"""
+    login_page = rt.settings.login_url
+    if not page.url.startswith(login_page):
+        await ready.goto(login_page)
+    Logger.log("登录", "填写表单...", "INFO")
+    await page.fill('#memberid', email)
+    await page.fill('#user_password', password)
+    login_url = page.url
+    await page.click('input[name="action_user_login"]')
+    await ready.url_change(login_url)
+    await ready.network_idle()
+    
+    if "login" in page.url:
+        await save_debug_info(rt, page, email, "login_failed")
+        return False
+    
+    await rt.sessions.save(email, await page.context.storage_state())
+    Logger.log("登录", "成功", "OK")
+    return True
+
+async def renew_vps(rt, page, email, detail_href, timer, budget=None, relogin=None, cached=False, preloaded=False):
+    """在已登录的页面中检查并续期一台 VPS
+    
+    流程分为三段，失败时按阶段预算退避后从代价最小的检查点继续，而不是重新登录:
+        detail  读取详情页的原到期时间和续期链接
+        extend  打开续期页 → 验证码 → Turnstile → 提交；提交前的失败直接重新打开续期页，
+                已点击提交后的失败先到 verify 读取详情页，避免重复提交
+        verify  回到详情页确认新到期时间；未生效且仍有续期链接时回到 extend
+    会话在中途失效时调用 relogin(page, ready) 重新登录 (login 预算) 后从 detail 继续。
+    运行预算用完时在 detail / extend / ocr / turnstile / submit 开始前停下并推迟；已经提交后
+    不再受预算限制 (页面等待也不再按剩余时间截断)，回到详情页确认结果。
+    cached 表示 detail_href 来自导航缓存: 详情页被重定向或读不到到期时间时返回带 stale 的结果，
+    由调用方读取列表页后重新处理。preloaded 表示 page 已经打开了该详情页。
+    """
+    vps = vps_label(detail_href)
+    debug_name = f"{email}_{vps}"
+    budget = budget or RetryBudget()
+    errored = False
+    ready = Readiness(page)
+    detail_url = urljoin(rt.settings.base_url, detail_href)
+    result = {"email": email, "vps": vps, "success": False, "msg": "", "old_expire": None, "new_expire": None}
+    cdp = None
+    extend_href = None
+    # 已点击提交、还没有回到详情页确认结果
+    submitted = False
+    run_deadline = _deadline.get()
+    
+    def check_session():
+        if "login" in page.url:
+            raise StageFailed('login', "会话已失效")
+    
+    async def read_detail():
+        """读取详情页，返回 (到期时间, 续期链接)"""
+        nonlocal preloaded
+        if preloaded:
+            preloaded = False
+        else:
+            await ready.goto(detail_url)
+        check_session()
+        snap = await take_snapshot(page)
+        return parse_expire_text(snap['expireText']), snap['extendHref']
+    
+    async def extend_and_submit():
+        nonlocal cdp, submitted
+        # 访问续期页面
+        check_deadline('extend')
+        timer.stage('extend')
+        await ready.goto(urljoin(rt.settings.base_url, extend_href))
+        check_session()
+        
+        # 点击"继续使用免费VPS"
+        snap = await take_snapshot(page)
+        if snap['hasFreeVpsButton']:
+            await page.click('button:has-text("無料VPS"), a:has-text("無料VPS")')
+            Logger.log("续期", "点击继续使用免费VPS", "OK")
+            await ready.load_state('domcontentloaded')
+            await ready.selector('img[src^="data:image"], .cf-turnstile, input[type="submit"], button[type="submit"]',
+                                 state='attached')
+            snap = await take_snapshot(page)
+        
+        # OCR 验证码 - 使用 base64 图片
+        check_deadline('ocr')
+        timer.stage('ocr')
+        captcha_base64 = snap['captcha']
+        if captcha_base64:
+            Logger.log("验证码", "检测到验证码图片", "INFO")
+            captcha_result = await ocr_captcha(rt.http, captcha_base64)
+            if not captcha_result:
+                raise StageFailed('ocr', "验证码识别失败", "captcha_ocr_failed")
+            if not await fill_captcha(page, captcha_result, snap['inputs']):
+                raise StageFailed('ocr', "验证码填入失败", "captcha_fill_failed")
+        else:
+            Logger.log("验证码", "页面无验证码图片", "INFO")
+        
+        # 处理 Turnstile
+        check_deadline('turnstile')
+        timer.stage('turnstile')
+        cdp = cdp or await page.context.new_cdp_session(page)
+        if not await handle_turnstile(page, cdp, ready, rt.http, snap['turnstile']):
+            raise StageFailed('turnstile', "Turnstile 验证失败", "turnstile_failed")
+        
+        # 保存提交前截图
+        check_deadline('submit')
+        # 已决定提交: 提交和确认结果期间的等待不按运行预算截断，确认之前不能停下
+        _deadline.set(None)
+        timer.stage('submit')
+        await save_debug_info(rt, page, debug_name, "before_submit")
+        
+        # 查找并点击提交按钮 (Turnstile 完成后按钮状态已变化，重新取快照)
+        submit = (await take_snapshot(page))['submit']
+        
+        submit_clicked = False
+        # 提交后可能停留在同一 URL，因此等待表单 POST 的响应而不是 URL 变化
+        submit_response = asyncio.create_task(ready.response(
+            "submit:response", lambda r: r.request.method == 'POST' and r.request.resource_type == 'document'))
+        if submit:
+            try:
+                Logger.log("续期", f"找到提交按钮: {submit['text']}", "INFO")
+                await page.click(submit['selector'])
+                submit_clicked = True
+                Logger.log("续期", "已点击提交", "OK")
+            except Exception as e:
+                Logger.log("续期", f"点击失败 ({submit['selector']}): {e}", "WARN")
+        
+        if not submit_clicked:
+            # 尝试强制点击
+            try:
+                await page.click('input[type="submit"], button[type="submit"]', force=True)
+                Logger.log("续期", "强制提交", "OK")
+                submit_clicked = True
+            except Exception as e:
+                Logger.log("续期", f"强制提交失败: {e}", "WARN")
+        
+        if not submit_clicked:
+            submit_response.cancel()
+            raise StageFailed('submit', "提交按钮点击失败", "submit_failed")
+        submitted = True
+        
+        # 等待提交响应
+        await submit_response
+        await ready.load_state('domcontentloaded')
+        await ready.network_idle()
+        
+        # 检查提交后页面
+        page_text = await page.evaluate('() => document.body.innerText')
+        Logger.log("续期", f"提交后URL: {page.url}", "INFO")
+        
+        # 保存提交后截图
+        await save_debug_info(rt, page, debug_name, "after_submit")
+        
+        # 检查是否有错误或成功提示 (以回到详情页后的到期时间为准)
+        if "エラー" in page_text or "失敗" in page_text:
+            Logger.log("续期", "页面显示错误", "WARN")
+        if "完了" in page_text or "更新しました" in page_text:
+            Logger.log("续期", "页面显示成功", "OK")
+    
+    async def verify():
+        nonlocal extend_href, submitted
+        # 回到详情页获取新到期时间
+        timer.stage('verify')
+        new_expire, extend_href = await read_detail()
+        submitted = False
+        _deadline.set(run_deadline)
+        old_expire = result["old_expire"]
+        if new_expire:
+            Logger.log("到期时间", f"新到期时间: {new_expire}", "INFO")
+            result["new_expire"] = new_expire
+        else:
+            raise StageFailed('verify', "无法获取到期时间，续期状态未知", "no_new_expire")
+        
+        # 对比到期时间判断是否成功
+        if not old_expire:
+            result["msg"] = f"续期状态未知 (新到期: {new_expire}, 无法对比)"
+            Logger.log("续期", result["msg"], "WARN")
+        elif new_expire > old_expire:
+            result["success"] = True
+            result["msg"] = f"续期成功: {old_expire} → {new_expire}"
+            Logger.log("续期", f"✓ 续期成功: {old_expire} → {new_expire}", "OK")
+        elif extend_href:
+            # 续期链接仍在，说明提交没有被接受 (多半是验证码错误)，重新走一遍续期页
+            raise StageFailed('submit', f"续期未生效: {old_expire} == {new_expire}", "renew_not_effective")
+        else:
+            raise StageFailed('verify', f"续期未生效: {old_expire} == {new_expire}", "renew_not_effective")
+    
+    # 每个阶段失败后从哪个检查点继续
+    resume_from = {'login': 'detail', 'detail': 'detail', 'extend': 'extend', 'ocr': 'extend',
+                   'turnstile': 'extend', 'submit': 'extend', 'verify': 'verify'}
+    checkpoint = 'detail'
+    final_verify = False
+    
+    try:
+        while True:
+            try:
+                if checkpoint == 'detail':
+                    # 访问详情页获取原到期时间
+                    check_deadline('detail')
+                    timer.stage('detail')
+                    old_expire, extend_href = await read_detail()
+                    if cached:
+                        cached = False
+                        if not old_expire or not same_page(page.url, detail_href):
+                            Logger.log("导航", "缓存的详情页已失效", "WARN")
+                            result["stale"] = True
+                            result["msg"] = "缓存的详情页已失效"
+                            return result
+                    if old_expire:
+                        Logger.log("到期时间", f"原到期时间: {old_expire}", "INFO")
+                        result["old_expire"] = old_expire
+                    else:
+                        Logger.log("到期时间", "无法解析原到期时间", "WARN")
+                        await save_debug_info(rt, page, debug_name, "no_old_expire")
+                    
+                    # 查找续期链接
+                    if not extend_href:
+                        result["msg"] = "未找到续期链接（可能还未到续期时间）"
+                        return result
+                    Logger.log("续期", "找到续期链接", "OK")
+                    checkpoint = 'extend'
+                
+                if checkpoint == 'extend':
+                    await extend_and_submit()
+                    checkpoint = 'verify'
+                
+                await verify()
+                return result
+            except DeadlineReached as e:
+                return mark_deferred(result, e)
+            except StageFailed as e:
+                failure = e
+            except Exception as e:
+                # 超时等意外错误算作当前阶段的失败
+                failure = StageFailed(timer.current_stage or checkpoint, f"错误: {str(e)[:100]}")
+            if not submitted:
+                _deadline.set(run_deadline)
+            
+            if failure.debug:
+                await save_debug_info(rt, page, debug_name, failure.debug)
+            if not await budget.consume(failure.stage):
+                if submitted and not final_verify:
+                    # 提交已经发出但结果未确认: 不管预算如何都回详情页确认一次，避免把已生效的续期报成失败
+                    final_verify = True
+                    timer.fail()
+                    checkpoint = 'verify'
+                    Logger.log("续期", f"{failure.stage} 阶段重试次数已用完 ({failure.msg})，已提交，回到详情页确认", "WARN")
+                    continue
+                errored = failure.msg.startswith("错误")
+                result["msg"] = failure.msg
+                Logger.log("续期", f"{failure.stage} 阶段失败且重试次数已用完: {failure.msg}", "WARN")
+                return result
+            timer.fail()
+            # 提交已经发出时先回详情页确认，续期链接仍在时 verify 会再回到 extend
+            checkpoint = 'verify' if submitted else resume_from.get(failure.stage, 'detail')
+            Logger.log("重试", f"{failure.stage} 阶段失败 ({failure.msg})，第 {budget.used[failure.stage]} 次重试，"
+                              f"从 {checkpoint} 继续", "WARN")
+            if failure.stage == 'login':
+                timer.stage('login')
+                if not relogin or not await relogin(page, ready):
+                    result["msg"] = "会话已失效，重新登录失败"
+                    return result
+    except Exception as e:
+        errored = True
+        result["msg"] = f"错误: {str(e)[:100]}"
+        Logger.log("错误", result["msg"], "WARN")
+    finally:
+        timer.end('ok' if result["success"] else 'error' if errored else 'stopped')
+        result["timing"] = timer.summary()
+        result["waits"] = ready.timings
+        if budget.used:
+            result["retries"] = dict(budget.used)
+    
+    return result
+
+async def renew_account(rt, email, password, timer=None, options=None):
+    """登录单个账号，并在同一个上下文中并行处理其下所有 VPS，返回每台 VPS 的结果列表
+    
+    每台 VPS 使用独立的标签页，同一账号同时打开的标签页不超过 settings.tabs。
+    登录失败、找不到 VPS 等账号级的问题返回只有一条且不带 vps 的结果。
+    options 为账号文件中的逐账号覆盖项 (tabs / stage_retries / proxy)。
+    导航缓存命中时直接打开第一台 VPS 的详情页，不经过列表页；缓存失效时读取列表页后重新处理失效的 VPS。
+    """
+    options = options or {}
+    Logger.log("账号", f"处理: {email}", "WAIT")
+    
+    timer = timer or StageTimer(email)
+    settings = rt.settings
+    index_url = settings.vps_index_url
+    errored = False
+    context = None
+    ready = None
+    blocker = None
+    logged_in = False
+    result = {"email": email, "success": False, "msg": "", "old_expire": None, "new_expire": None}
+    results = [result]
+    
+    try:
+        timer.stage('browser')
+        storage_state = rt.sessions.load(email)
+        context_options = {'storage_state': storage_state}
+        if options.get('proxy'):
+            context_options['proxy'] = {'server': options['proxy']}
+        context = await rt.browsers.new_context(**context_options)
+        await rt.tracer.start(context)
+        if settings.block_resources:
+            blocker = ResourceBlocker()
+            await blocker.attach(context)
+        page = await context.new_page()
+        ready = Readiness(page)
+        cached = rt.nav.get(email) if rt.nav else None
+        start_url = urljoin(settings.base_url, cached[0]) if cached else index_url
+        
+        async def read_index():
+            """从 VPS 列表页读取详情页地址，并更新导航缓存"""
+            if not same_page(page.url, index_url):
+                await ready.goto(index_url)
+            await ready.selector('a[href*="server/detail"]', state='attached')
+            hrefs = (await take_snapshot(page))['detailHrefs']
+            if rt.nav:
+                rt.nav.put(email, hrefs)
+            return hrefs
+        
+        # 有保存的会话时直接访问 VPS 列表 (导航缓存命中时为第一台 VPS 的详情页)，被重定向到登录页说明会话已失效
+        if storage_state:
+            timer.stage('session')
+            Logger.log("会话", "已加载", "OK")
+            await ready.goto(start_url)
+            if "login" in page.url:
+                Logger.log("会话", "已失效，重新登录", "INFO")
+        
+        # 登录
+        if not storage_state or "login" in page.url:
+            check_deadline('login')
+            timer.stage('login')
+            if not await login(rt, page, ready, email, password):
+                result["msg"] = "登录失败"
+                return results
+            
+            # 访问 VPS 列表
+            if not cached:
+                timer.stage('index')
+            await ready.goto(start_url)
+        
+        logged_in = True
+        if cached:
+            detail_hrefs = cached
+            Logger.log("导航", f"使用缓存的详情页地址，跳过 VPS 列表 ({len(cached)} 台)", "INFO")
+        else:
+            detail_hrefs = await read_index()
+        if not detail_hrefs:
+            await save_debug_info(rt, page, email, "no_vps")
+            result["msg"] = "未找到 VPS"
+            return results
+        Logger.log("账号", f"共 {len(detail_hrefs)} 台 VPS", "INFO")
+        
+        tabs = asyncio.Semaphore(max(1, options.get('tabs') or settings.tabs))
+        relogin_lock = asyncio.Lock()
+        
+        async def relogin(tab, tab_ready):
+            """会话在处理中途失效时重新登录；多个标签页同时发现时只登录一次"""
+            async with relogin_lock:
+                await tab_ready.goto(index_url)
+                if "login" not in tab.url:
+                    return True
+                Logger.log("会话", "处理中途失效，重新登录", "WARN")
+                return await login(rt, tab, tab_ready, email, password)
+        
+        async def process_vps(href, tab, from_cache=False):
+            async with tabs:
+                # 每台 VPS 从账号的公共阶段 (登录、列表) 派生各自的计时器
+                vps_timer = timer.fork()
+                _stage_timer.set(vps_timer)
+                if len(detail_hrefs) > 1:
+                    _log_account.set(f"{_log_account.get() or email} #{vps_label(href)}")
+                tab = tab or await context.new_page()
+                try:
+                    budget = RetryBudget(parse_stage_retries(options['stage_retries'])) if options.get('stage_retries') else None
+                    return await renew_vps(rt, tab, email, href, vps_timer, budget=budget, relogin=relogin,
+                                           cached=from_cache, preloaded=from_cache and tab is page)
+                finally:
+                    if tab is not page:
+                        await tab.close()
+        
+        async def process_all(hrefs, from_cache=False):
+            # 第一台 VPS 复用列表页 (或已打开的详情页) 所在的标签页
+            outcomes = await asyncio.gather(*(process_vps(href, page if i == 0 else None, from_cache)
+                                              for i, href in enumerate(hrefs)), return_exceptions=True)
+            batch = []
+            for href, outcome in zip(hrefs, outcomes):
+                if isinstance(outcome, BaseException):
+                    outcome = {"email": email, "vps": vps_label(href), "success": False,
+                               "msg": f"错误: {str(outcome)[:100]}", "old_expire": None, "new_expire": None}
+                batch.append(outcome)
+            return batch
+        
+        results = await process_all(detail_hrefs, from_cache=bool(cached))
+        if any(r.get("stale") for r in results):
+            # 缓存的地址失效 (VPS 被删除或地址变化)，读取列表页后处理尚未处理的 VPS
+            rt.nav.invalidate(email)
+            Logger.log("导航", "缓存的详情页已失效，重新读取 VPS 列表", "WARN")
+            if await relogin(page, ready):
+                done = {r["vps"] for r in results if not r.get("stale")}
+                results = [r for r in results if not r.get("stale")] + await process_all(
+                    [h for h in await read_index() if vps_label(h) not in done])
+            if not results:
+                result["msg"] = "未找到 VPS"
+                results = [result]
+        
+    except DeadlineReached as e:
+        mark_deferred(result, e)
+    except Exception as e:
+        errored = True
+        result["msg"] = f"错误: {str(e)[:100]}"
+        Logger.log("错误", result["msg"], "WARN")
+    finally:
+        timer.end('ok' if any(r["success"] for r in results) else 'error' if errored else 'stopped')
+        if logged_in and context:
+            # 保存运行过程中可能被轮换的 cookie 和 localStorage
+            try:
+                await rt.sessions.save(email, await context.storage_state())
+            except Exception as e:
+                Logger.log("会话", f"保存失败: {e}", "WARN")
+        # 资源统计是整个上下文的，只记在第一条结果上，汇总时不会重复计算
+        if blocker:
+            results[0]["resources"] = blocker.summary()
+            Logger.log("资源", f"拦截 {blocker.summary()['blocked_total']} 个请求 {dict(blocker.blocked)}，"
+                              f"下载约 {blocker.approx_bytes_loaded / 1024:.0f} KB (按 Content-Length)", "INFO")
+        if ready:
+            results[0]["waits"] = ready.timings + results[0].get("waits", [])
+            waits = [w for r in results for w in r.get("waits", [])]
+            Logger.log("等待", f"共 {len(waits)} 次等待，耗时 {sum(w['seconds'] for w in waits):.1f}s", "INFO")
+        if context:
+            await rt.tracer.finish(context, email, results)
+            await rt.browsers.release(context)
+    
+    return results
+
+async def run_accounts(rt, accounts, workers=1, force=False, interval=None):
+    """并发处理多个账号，结果按输入顺序返回，有多台 VPS 的账号每台一条
+    
+    需要浏览器的账号按到期日从早到晚获得并发名额；设置了运行预算 (rt.deadline) 时，
+    预算不足以开始的账号推迟到下次运行，已开始的账号在预算用完时中止。
+    每个并发槽处理完一个账号后等待 interval 秒 (默认取 rt.settings)，库调用传 0 不等待。
+    """
+    if interval is None:
+        interval = rt.settings.account_interval
+    gate = UrgencyGate(workers)
+    emails = [acc['email'] for acc in accounts]
+    priority = {email: i for i, email in enumerate(rt.state.by_urgency(emails) if rt.state else emails)}
+    
+    def deferred(acc):
+        rt.deadline.deferred += 1
+        Logger.log("预算", f"{acc['email']}: 剩余 {rt.deadline.remaining():.0f}s，推迟到下次运行", "WARN")
+        return [{"email": acc['email'], "success": False, "skipped": True, "deferred": True,
+                 "msg": "运行时间预算不足，推迟到下次运行", "old_expire": None, "new_expire": None}]
+    
+    async def worker(acc):
+        timer = StageTimer(acc['email'])
+        _stage_timer.set(timer)
+        _deadline.set(rt.deadline)
+        _settings.set(rt.settings)
+        results = await process(acc, timer)
+        if timer.total is None:
+            timer.end('ok' if any(r['success'] for r in results) else 'stopped')
+        for result in results:
+            result.setdefault('timing', timer.summary())
+        if rt.notifier:
+            rt.notifier.post_results(results)
+        return results
+    
+    async def process(acc, timer):
+        if rt.state and not force:
+            reason = rt.state.skip_reason(acc['email'])
+            if reason:
+                Logger.log("跳过", f"{acc['email']}: {reason}", "INFO")
+                return [{"email": acc['email'], "success": False, "skipped": True, "msg": reason,
+                         "old_expire": None, "new_expire": None}]
+        if rt.deadline and not rt.deadline.can_start():
+            return deferred(acc)
+        if rt.leases and not await rt.leases.acquire(acc['email']):
+            msg = f"正由 {await rt.leases.holder(acc['email'])} 处理"
+            Logger.log("跳过", f"{acc['email']}: {msg}", "INFO")
+            return [{"email": acc['email'], "success": False, "skipped": True, "msg": msg,
+                     "old_expire": None, "new_expire": None}]
+        try:
+            return await handle(acc, timer)
+        finally:
+            if rt.leases:
+                await rt.leases.release(acc['email'])
+    
+    async def handle(acc, timer):
+        if rt.settings.http_fastpath:
+            with timer.span('fastpath'):
+                info = await check_account_http(rt.http, rt.sessions, acc['email'], proxy=acc.get('proxy'), nav=rt.nav,
+                                                settings=rt.settings)
+            vps = info["vps"]
+            if (info["session"] == "valid" and vps and not info["error"]
+                    and all(v["expire"] and not v["extend"] for v in vps)):
+                # 会话有效且所有 VPS 都还没有续期链接，无需启动浏览器
+                Logger.log("快速检查", f"{acc['email']}: {len(vps)} 台 VPS 最早到期 {info['expire']}，暂无续期链接", "INFO")
+                results = [{"email": acc['email'], "vps": v["vps"], "success": False,
+                            "msg": "未找到续期链接（可能还未到续期时间）",
+                            "old_expire": v["expire"], "new_expire": None} for v in vps]
+                if rt.state:
+                    await rt.state.save_account(acc['email'], results)
+                return results
+            if info["session"] != "valid":
+                Logger.log("快速检查", f"{acc['email']}: 会话{'已过期' if info['session'] == 'expired' else '不存在'}，使用浏览器", "INFO")
+        async with (gate.slot(priority[acc['email']]),
+                    rt.governor.admit(acc['email']) if rt.governor else nullcontext()):
+            # 需要浏览器的账号按预计耗时准入；开始后不取消，预算用完时由各阶段自行停下
+            if rt.deadline and not rt.deadline.can_start(rt.deadline.estimate()):
+                return deferred(acc)
+            _log_account.set(acc['email'] if workers > 1 else '')
+            started = time.monotonic()
+            results = await renew_account(rt, acc['email'], acc['password'], timer, options=acc)
+            if rt.deadline and not any(r.get('deferred') for r in results):
+                rt.deadline.record(time.monotonic() - started)
+            if rt.state:
+                await rt.state.save_account(acc['email'], results)
+            if interval:
+                await asyncio.sleep(interval)
+            return results
+    
+    # 按紧急程度创建任务，最先空出的名额也给最紧急的账号
+    tasks = {i: asyncio.create_task(worker(accounts[i]))
+             for i in sorted(range(len(accounts)), key=lambda i: priority[accounts[i]['email']])}
+    outcomes = await asyncio.gather(*(tasks[i] for i in range(len(accounts))), return_exceptions=True)
+    
+    results = []
+    for acc, outcome in zip(accounts, outcomes):
+        if isinstance(outcome, BaseException):
+            # 单个账号异常不影响其他账号
+            Logger.log("错误", f"{acc['email']}: {outcome!r}", "WARN")
+            outcome = [{"email": acc['email'], "success": False, "msg": f"错误: {str(outcome)[:100]}",
+                        "old_expire": None, "new_expire": None}]
+        results.extend(outcome)
+    return results
+
+class ResultQueue:
+    """工作进程中代替 TelegramNotifier: 每个账号处理完就把结果交给主进程推送"""
+    def __init__(self, queue):
+        self.queue = queue
+    
+    def post_results(self, results):
+        self.queue.put(results)
+
+def _process_worker(index, accounts, workers, force, budget, mem_limit_mb, queue=None):
+    """--processes 的工作进程: 用自己的 Playwright 驱动、Chromium 和 HTTP 会话处理分到的账号
+    
+    返回 (结果列表, 资源统计)；传入 queue 时每个账号的结果处理完即放入队列。
+    """
+    Logger.process = f"P{index}"
+    return asyncio.run(_process_main(accounts, workers, force, budget, mem_limit_mb, queue))
+
+async def _process_main(accounts, workers, force, budget, mem_limit_mb, queue=None):
+    http = HttpClient(limit_per_host=max(8, workers * 2))
+    state = StateStore()
+    browsers = BrowserManager()
+    rt = Runtime(browsers, http, state, notifier=ResultQueue(queue) if queue is not None else None,
+                 leases=LeaseStore(), governor=ResourceGovernor(browsers, rss_limit_mb=mem_limit_mb),
+                 deadline=RunDeadline(budget) if budget else None,
+                 nav=NavigationCache() if SETTINGS.nav_cache else None)
+    try:
+        results = await run_accounts(rt, accounts, workers, force=force)
+    finally:
+        await rt.browsers.close()
+        await rt.artifacts.close()
+        await rt.leases.close()
+        await rt.governor.close()
+        if rt.nav:
+            rt.nav.log_summary()
+            rt.nav.close()
+        state.close()
+        await http.close()
+    return results, rt.governor.summary()
+
+async def run_processes(accounts, processes, workers, force=False, deadline=None, notifier=None):
+    """--processes: 把账号分给多个工作进程，每个进程内再以 workers 并发，结果按输入顺序合并
+    
+    账号按到期日排序后轮流分配，每个进程都分到一部分紧急的账号；内存上限按进程数均分，
+    运行预算以剩余时间传给各进程。工作进程用 spawn 启动，不继承本进程的事件循环和线程。
+    各账号的结果经队列传回，由本进程的 notifier 在处理完时推送；各进程的资源统计合并后输出。
+    """
+    state = StateStore()
+    try:
+        rank = {email: n for n, email in enumerate(state.by_urgency([acc['email'] for acc in accounts]))}
+    finally:
+        state.close()
+    order = sorted(range(len(accounts)), key=lambda i: rank[accounts[i]['email']])
+    processes = max(1, min(processes, len(accounts)))
+    chunks = [order[i::processes] for i in range(processes)]
+    Logger.log("多进程", f"{len(accounts)} 个账号分给 {processes} 个进程，每个进程并发 {workers}", "INFO")
+    loop = asyncio.get_running_loop()
+    ctx = multiprocessing.get_context('spawn')
+    results_by_index = {}
+    summaries = []
+    posted = set()
+    
+    async def stream(queue):
+        """把工作进程传回的结果交给 notifier，收到 None 时结束"""
+        while (results := await asyncio.to_thread(queue.get)) is not None:
+            posted.update(r['email'] for r in results)
+            notifier.post_results(results)
+    
+    with ctx.Manager() as manager, ProcessPoolExecutor(max_workers=processes, mp_context=ctx) as pool:
+        queue = manager.Queue() if notifier else None
+        streamer = asyncio.create_task(stream(queue)) if queue is not None else None
+        futures = [loop.run_in_executor(pool, _process_worker, n, [accounts[i] for i in chunk], workers, force,
+                                        deadline.remaining() if deadline else 0, SETTINGS.mem_limit_mb / processes, queue)
+                   for n, chunk in enumerate(chunks)]
+        outcomes = await asyncio.gather(*futures, return_exceptions=True)
+        if streamer:
+            queue.put(None)
+            await streamer
+    for chunk, outcome in zip(chunks, outcomes):
+        if isinstance(outcome, BaseException):
+            # 整个工作进程失败 (如进程崩溃)，其账号都记为失败
+            Logger.log("多进程", f"工作进程失败: {outcome!r}", "WARN")
+            outcome = [{"email": accounts[i]['email'], "success": False, "msg": f"错误: {str(outcome)[:100]}",
+                        "old_expire": None, "new_expire": None} for i in chunk]
+        else:
+            outcome, summary = outcome
+            summaries.append(summary)
+        index_of = {accounts[i]['email']: i for i in chunk}
+        for result in outcome:
+            results_by_index.setdefault(index_of[result['email']], []).append(result)
+    if summaries:
+        ResourceGovernor.log_stats(ResourceGovernor.merge(summaries))
+    results = [r for i in range(len(accounts)) for r in results_by_index.get(i, [])]
+    if notifier:
+        # 进程崩溃等情况下没有经队列推送过的账号，在这里补推
+        for i in range(len(accounts)):
+            if results_by_index.get(i) and accounts[i]['email'] not in posted:
+                notifier.post_results(results_by_index[i])
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="XServer VPS 续期脚本")
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help="并发处理的账号数 (默认取 XSERVER_WORKERS，未设置则为 1)")
+    parser.add_argument('--processes', type=int, default=PROCESSES,
+                        help="把账号分给多个工作进程 (各自启动 Chromium)，每个进程内按 --workers 并发 (默认取 XSERVER_PROCESSES，未设置则为 1)")
+    parser.add_argument('--force', action='store_true',
+                        help="忽略本地状态库，检查所有账号")
+    parser.add_argument('--check-only', action='store_true',
+                        help="只用已保存的会话通过 HTTP 并行检查到期时间，以 JSON 输出，不启动浏览器")
+    parser.add_argument('--daemon', action='store_true',
+                        help="常驻运行 Xvfb 和 Chromium，定时运行设置 XSERVER_CDP_URL 后连接它")
+    parser.add_argument('--schedule', action='store_true',
+                        help="常驻运行，按各账号的到期时间安排检查，代替每天固定时间的定时器")
+    parser.add_argument('--leases', action='store_true',
+                        help="以 JSON 输出当前的账号租约 (哪个进程正在处理哪个账号) 后退出")
+    parser.add_argument('--accounts', metavar='FILE', default=ACCOUNTS_FILE,
+                        help="账号文件 (.toml / .csv / .jsonl)，默认取 XSERVER_ACCOUNTS_FILE，未设置时使用 XSERVER_ACCOUNT")
+    parser.add_argument('--shard', metavar='I/N', type=parse_shard, default=SHARD,
+                        help="只处理按邮箱哈希分到第 I 片 (共 N 片，I 从 0 开始) 的账号，供多台机器分摊")
+    parser.add_argument('--profile', metavar='FILE', nargs='?', const=str(SETTINGS.debug_dir / "profile.prof"),
+                        help="记录整个运行的 cProfile 和 asyncio 任务耗时 (默认写入 debug/profile.prof)")
+    parser.add_argument('--budget', metavar='SECONDS', type=float, default=SETTINGS.run_budget,
+                        help="整个运行的时间预算，用完前按到期日先处理紧急的账号，其余推迟到下次运行 (默认取 XSERVER_RUN_BUDGET)")
+    return parser.parse_args(argv)
+
+async def check_only(accounts, workers):
+    """--check-only: 输出所有账号到期情况的 JSON 报告"""
+    Logger.stream = sys.stderr
+    http = HttpClient(limit_per_host=max(8, workers))
+    nav = NavigationCache() if SETTINGS.nav_cache else None
+    try:
+        infos = await check_accounts(http, SessionStore(), accounts, workers=max(8, workers), nav=nav)
+    finally:
+        await http.close()
+        if nav:
+            nav.log_summary()
+            nav.close()
+    today = date.today()
+    for info in infos:
+        for item in [info] + info["vps"]:
+            item["days_left"] = (item["expire"] - today).days if item["expire"] else None
+    print(json.dumps(infos, ensure_ascii=False, indent=2, default=str))
+
+async def report_results(notifier, results, notify=True):
+    """输出汇总、导出指标，并把汇总 (各账号结果已在处理完时推送) 放入通知队列"""
+    success = sum(1 for r in results if r['success'])
+    skipped = sum(1 for r in results if r.get('skipped'))
+    fail = len(results) - success - skipped
+    
+    print("=" * 50)
+    Logger.log("汇总", f"成功: {success}, 失败: {fail}, 跳过: {skipped}", "INFO")
+    deferred = [r['email'] for r in results if r.get('deferred')]
+    if deferred:
+        Logger.log("汇总", f"运行时间预算不足，{len(deferred)} 个账号推迟到下次运行: {', '.join(deferred)}", "WARN")
+    resources = [r['resources'] for r in results if r.get('resources')]
+    if resources:
+        Logger.log("汇总", f"共拦截 {sum(x['blocked_total'] for x in resources)} 个请求，"
+                          f"下载约 {sum(x['approx_bytes_loaded'] for x in resources) / 1024:.0f} KB (按 Content-Length)", "INFO")
+    try:
+        records = MetricsExporter().export(results)
+        for stage, st in stage_percentiles(records).items():
+            Logger.log("耗时", f"{stage}: {st['count']} 次, p50 {st['p50']:.1f}s, p95 {st['p95']:.1f}s, "
+                             f"最大 {st['max']:.1f}s", "INFO")
+    except Exception as e:
+        Logger.log("耗时", f"指标导出失败: {e}", "WARN")
+    
+    print("\n".join(["🖥 XServer VPS 续期", ""] + [result_line(r) for r in results]))
+    if notify and notifier:
+        failed = [html.escape(result_line(r)) for r in results if result_outcome(r) == 'failed']
+        notifier.post("\n".join([f"🖥 XServer VPS 续期: 成功 {success}, 失败 {fail}, 跳过 {skipped}"]
+                                + (["", "失败:"] + failed if failed else [])
+                                + (["", f"预算不足推迟: {len(deferred)} 个账号"] if deferred else [])))
+
+async def run_schedule(accounts, workers, max_sleep=3600):
+    """--schedule: 常驻运行，只在账号的下次检查时间到了时处理它
+    
+    下次检查时间由 StateStore 按到期日、续期窗口、失败次数计算；没有记录的账号立即检查。
+    每批处理完关闭自行启动的 Chromium，空闲时不占内存。收到 SIGTERM/SIGINT 时
+    等当前批次处理完后退出。
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    by_email = {acc['email']: acc for acc in accounts}
+    http = HttpClient(limit_per_host=max(8, workers * 2))
+    state = StateStore()
+    # 只推送续期成功或失败的账号，未到期的例行检查不打扰
+    notifier = TelegramNotifier(http, outcomes={'renewed', 'failed'})
+    browsers = BrowserManager()
+    rt = Runtime(browsers, http, state, notifier=notifier, leases=LeaseStore(),
+                 nav=NavigationCache() if SETTINGS.nav_cache else None)
+    try:
+        while not stop.is_set():
+            due, next_at = state.due(list(by_email))
+            if due:
+                Logger.log("调度", f"{len(due)} 个账号到达检查时间", "INFO")
+                rt.governor = ResourceGovernor(browsers)
+                try:
+                    results = await run_accounts(rt, [by_email[e] for e in due], workers, force=True)
+                finally:
+                    await rt.browsers.close()
+                # 处理中途异常、没有写入结果的账号按失败退避，避免立即重复处理
+                for email in state.due(due)[0]:
+                    state.schedule(email, failed=True)
+                rt.governor.log_summary()
+                if rt.nav:
+                    rt.nav.log_summary()
+                await report_results(notifier, results,
+                                     notify=any(result_outcome(r) in ('renewed', 'failed') for r in results))
+                continue
+            wait = max(1.0, min(max_sleep, (next_at - datetime.now()).total_seconds())) if next_at else max_sleep
+            Logger.log("调度", f"下次检查: {next_at:%Y-%m-%d %H:%M}，等待 {wait / 60:.0f} 分钟" if next_at
+                       else f"没有待检查的账号，等待 {wait / 60:.0f} 分钟", "INFO")
+            try:
+                await asyncio.wait_for(stop.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await rt.browsers.close()
+        await rt.artifacts.close()
+        await rt.leases.close()
+        if rt.governor:
+            await rt.governor.close()
+        if rt.nav:
+            rt.nav.close()
+        await notifier.flush()
+        state.close()
+        await http.close()
+
+def load_accounts(args, out=sys.stdout):
+    """按命令行参数读取账号清单，出错或没有账号时输出提示并返回空列表"""
+    shard = args.shard
+    try:
+        accounts = list(iter_accounts(args.accounts, shard))
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"错误: 无法读取账号文件 {args.accounts}: {e}", file=out)
+        return []
+    if not accounts:
+        if shard:
+            print(f"分片 {shard[0]}/{shard[1]} 没有分到账号", file=out)
+        elif args.accounts:
+            print(f"错误: 账号文件 {args.accounts} 中没有可用账号", file=out)
+        else:
+            print("错误: 未配置 XSERVER_ACCOUNT 环境变量或账号文件", file=out)
+            print("格式: email:password 或 email1:pass1&email2:pass2，或用 --accounts 指定账号文件", file=out)
+    return accounts
+
+async def main(args=None):
+    args = args or parse_args([])
+    if args.daemon:
+        await BrowserDaemon().run()
+        return
+    if args.leases:
+        leases = LeaseStore()
+        print(json.dumps(leases.entries(), ensure_ascii=False, indent=2))
+        await leases.close()
+        return
+    if args.check_only:
+        Logger.stream = sys.stderr
+        accounts = load_accounts(args, out=sys.stderr)
+        if not accounts:
+            return
+        await check_only(accounts, args.workers)
+        return
+    
+    # 预算从进程启动算起，与 systemd 的 TimeoutStartSec 对应
+    deadline = RunDeadline(args.budget) if args.budget and not args.schedule else None
+    
+    print("=" * 50)
+    print("XServer VPS 续期脚本")
+    print("=" * 50)
+    
+    accounts = load_accounts(args)
+    if not accounts:
+        return
+    
+    shard = f"，分片 {args.shard[0]}/{args.shard[1]}" if args.shard else ""
+    budget = f"，运行预算 {args.budget:.0f}s" if deadline else ""
+    processes = f"，{args.processes} 个进程" if args.processes > 1 else ""
+    Logger.log("配置", f"共 {len(accounts)} 个账号，并发数 {args.workers}{processes}{shard}{budget}", "INFO")
+    if SETTINGS.yescaptcha_key:
+        Logger.log("配置", "YesCaptcha 已配置", "OK")
+    else:
+        Logger.log("配置", "警告: 未配置 YESCAPTCHA_KEY，Turnstile 可能失败", "WARN")
+    
+    if args.schedule:
+        Logger.log("调度", "常驻运行，按到期时间安排检查", "INFO")
+        await run_schedule(accounts, args.workers)
+        return
+    
+    http = HttpClient(limit_per_host=max(8, args.workers * 2))
+    state = StateStore()
+    notifier = TelegramNotifier(http)
+    try:
+        if args.processes > 1:
+            results = await run_processes(accounts, args.processes, args.workers, force=args.force,
+                                          deadline=deadline, notifier=notifier)
+            await report_results(notifier, results)
+            return
+        
+        # Chromium 只在有账号需要浏览器时才启动
+        browsers = BrowserManager()
+        rt = Runtime(browsers, http, state, notifier=notifier, leases=LeaseStore(),
+                     governor=ResourceGovernor(browsers), deadline=deadline,
+                     nav=NavigationCache() if SETTINGS.nav_cache else None)
+        try:
+            results = await run_accounts(rt, accounts, args.workers, force=args.force)
+        finally:
+            await rt.browsers.close()
+            await rt.artifacts.close()
+            await rt.leases.close()
+            await rt.governor.close()
+            if rt.nav:
+                rt.nav.close()
+        rt.governor.log_summary()
+        if rt.nav:
+            rt.nav.log_summary()
+        
+        await report_results(notifier, results)
+    finally:
+        await notifier.flush()
+        state.close()
+        await http.close()
+
+# ==================== 库接口 ====================
+def _account(account):
+    if isinstance(account, str):
+        accounts = parse_accounts(account)
+        if not accounts:
+            raise ValueError("账号格式应为 email:password")
+        return accounts[0]
+    return dict(account)
+
+async def renew(account, *, browser=None, http=None, state=None, sessions=None, settings=None):
+    """在调用方的事件循环中续期单个账号，返回各台 VPS 的结果列表 (与命令行汇总中的结果相同)
+    
+    account 为 "email:password" 或 {'email', 'password', 可选 tabs / stage_retries / proxy}。
+    browser 可传入已启动的 Playwright Browser 或 BrowserManager，http 可传入 HttpClient 或
+    aiohttp.ClientSession，传入的对象由调用方负责关闭；未传入时临时创建，返回前关闭。
+    传入 state (StateStore) 时记录结果和下次检查时间。
+    settings (Settings) 为本次调用的配置，未传入时在调用时读取环境变量。
+    """
+    account = _account(account)
+    settings = settings or Settings.from_env()
+    client = http if isinstance(http, HttpClient) else HttpClient(session=http)
+    browsers = browser if isinstance(browser, BrowserManager) else BrowserManager(browser=browser, settings=settings)
+    rt = Runtime(browsers, client, state, sessions=sessions, settings=settings)
+    try:
+        return await run_accounts(rt, [account], force=True, interval=0)
+    finally:
+        if browsers is not browser:
+            await browsers.close()
+        await rt.artifacts.close()
+        if client is not http:
+            await client.close()
+
+async def check(account, *, http=None, sessions=None, settings=None):
+    """不启动浏览器，用已保存的会话读取账号各台 VPS 的到期时间 (同 --check-only 中的一项)
+    
+    settings (Settings) 为本次调用的配置，未传入时在调用时读取环境变量。
+    """
+    account = _account(account)
+    settings = settings or Settings.from_env()
+    client = http if isinstance(http, HttpClient) else HttpClient(session=http)
+    try:
+        return await check_account_http(client, sessions or SessionStore(settings=settings), account['email'],
+                                        proxy=account.get('proxy'), settings=settings)
+    finally:
+        if client is not http:
+            await client.close()
+
+def cli(argv=None):
+    """命令行入口 (xserver-renew 命令和 xserver-renew.py)"""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    asyncio.run(Profiler(args.profile).run(main(args)) if args.profile else main(args))
+
+if __name__ == "__main__":
+    cli()